@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import sys
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Config
+SOURCE_DIRS = ["../art_src"]         # One PNG per building/actor
+EXCLUDE_SUFFIXES = ("_original",)    # Backups like GemMine_v2_original.png
+OUTPUT_DIR = "atlases"
+MANIFEST_FILE = "atlas_manifest.json"
+RES_PREFIX = "res://assets/atlases" # Where OUTPUT_DIR lives inside the Godot project
+
+MAX_ATLAS_SIZE = 2048
+PADDING = 2       # Gap between sprites (px on every side)
+EXTRUDE = 2       # Edge pixels copied into the padding so filtering never samples a neighbour
+WORKERS = None    # Threads for hashing/decoding/encoding (PIL releases the GIL)
+
+# Writes an AtlasTexture .tres per sprite so scenes can swap res://art_src/X.png for it
+EMIT_ATLAS_TEXTURES = True
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def collect_sprites():
+    """Returns {name: path} for every source PNG."""
+    sprites = {}
+    for src in SOURCE_DIRS:
+        if not os.path.isdir(src):
+            print(f"Warning: {src} not found.")
+            continue
+        for f in sorted(os.listdir(src)):
+            name, ext = os.path.splitext(f)
+            if ext.lower() != ".png" or name.endswith(EXCLUDE_SUFFIXES):
+                continue
+            if name in sprites:
+                print(f"Warning: duplicate sprite name {name}, keeping {sprites[name]}")
+                continue
+            sprites[name] = os.path.join(src, f)
+    return sprites
+
+def next_pow2(v):
+    p = 1
+    while p < v:
+        p <<= 1
+    return p
+
+class SkylinePacker:
+    """Bottom-left skyline bin packing into a fixed width x height bin."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.skyline = [(0, 0, width)] # (x, y, segment width)
+
+    def _fit(self, i, w, h):
+        # Lowest y at which a w-wide rect can sit starting on skyline segment i
+        x = self.skyline[i][0]
+        if x + w > self.width:
+            return None
+        y = 0
+        remaining = w
+        j = i
+        while remaining > 0:
+            if j >= len(self.skyline):
+                return None
+            y = max(y, self.skyline[j][1])
+            if y + h > self.height:
+                return None
+            remaining -= self.skyline[j][2]
+            j += 1
+        return y
+
+    def insert(self, w, h):
+        best = None
+        for i in range(len(self.skyline)):
+            y = self._fit(i, w, h)
+            if y is None:
+                continue
+            x = self.skyline[i][0]
+            if best is None or (y + h, x) < (best[1] + h, best[0]):
+                best = (x, y, i)
+        if best is None:
+            return None
+
+        x, y, i = best
+        self._add_segment(i, x, y + h, w)
+        return x, y
+
+    def _add_segment(self, i, x, y, w):
+        self.skyline.insert(i, (x, y, w))
+        # Trim the segments now covered by the new one
+        j = i + 1
+        while j < len(self.skyline):
+            sx, sy, sw = self.skyline[j]
+            prev_end = self.skyline[j - 1][0] + self.skyline[j - 1][2]
+            if sx >= prev_end:
+                break
+            shrink = prev_end - sx
+            if sw <= shrink:
+                self.skyline.pop(j)
+            else:
+                self.skyline[j] = (sx + shrink, sy, sw - shrink)
+                break
+        # Merge neighbours at the same height
+        merged = [self.skyline[0]]
+        for seg in self.skyline[1:]:
+            last = merged[-1]
+            if last[1] == seg[1]:
+                merged[-1] = (last[0], last[1], last[2] + seg[2])
+            else:
+                merged.append(seg)
+        self.skyline = merged
+
+def pack_sizes(sizes, max_size=MAX_ATLAS_SIZE):
+    """Packs {name: (w, h)} (already padded) into as few power-of-two bins as possible.
+
+    Returns a list of (bin_w, bin_h, {name: (x, y)}). Each bin starts at the smallest
+    power of two that could hold the remaining area and grows until everything
+    fits or it hits max_size, in which case the leftovers spill into the next bin.
+    """
+    remaining = sorted(sizes, key=lambda n: (-sizes[n][1], -sizes[n][0], n))
+    bins = []
+    while remaining:
+        area = sum(sizes[n][0] * sizes[n][1] for n in remaining)
+        widest = max(sizes[n][0] for n in remaining)
+        tallest = max(sizes[n][1] for n in remaining)
+        bw = min(next_pow2(max(widest, int(area ** 0.5))), max_size)
+        bh = min(next_pow2(max(tallest, -(-area // bw))), max_size)
+
+        while True:
+            packer = SkylinePacker(bw, bh)
+            placed = {}
+            for n in remaining:
+                pos = packer.insert(*sizes[n])
+                if pos is not None:
+                    placed[n] = pos
+            if len(placed) == len(remaining) or (bw >= max_size and bh >= max_size):
+                break
+            # Grow the shorter side first to stay close to square
+            if bw <= bh and bw < max_size:
+                bw *= 2
+            else:
+                bh *= 2
+
+        if not placed:
+            # Bigger than max_size on its own: give it a dedicated bin
+            n = remaining[0]
+            placed = {n: (0, 0)}
+            bw, bh = next_pow2(sizes[n][0]), next_pow2(sizes[n][1])
+
+        bins.append((bw, bh, placed))
+        remaining = [n for n in remaining if n not in placed]
+    return bins
+
+def extrude(atlas, sprite, x, y, amount):
+    """Pastes sprite at (x, y) and repeats its border pixels `amount` px outwards."""
+    w, h = sprite.size
+    atlas.paste(sprite, (x, y))
+    if amount <= 0:
+        return
+    top = sprite.crop((0, 0, w, 1)).resize((w, amount))
+    bottom = sprite.crop((0, h - 1, w, h)).resize((w, amount))
+    atlas.paste(top, (x, y - amount))
+    atlas.paste(bottom, (x, y + h))
+    # Sides include the already extruded rows so corners get filled too
+    strip_top, strip_bottom = y - amount, y + h + amount
+    left = atlas.crop((x, strip_top, x + 1, strip_bottom)).resize((amount, h + 2 * amount))
+    right = atlas.crop((x + w - 1, strip_top, x + w, strip_bottom)).resize((amount, h + 2 * amount))
+    atlas.paste(left, (x - amount, strip_top))
+    atlas.paste(right, (x + w, strip_top))
+
+def compose_atlas(job):
+    index, bw, bh, entries, out_path = job
+    atlas = Image.new("RGBA", (bw, bh), (0, 0, 0, 0))
+    for name, path, (x, y, w, h) in entries:
+        with Image.open(path) as img:
+            extrude(atlas, img.convert("RGBA"), x, y, min(EXTRUDE, PADDING))
+    atlas.save(out_path, optimize=True)
+    return index, out_path
+
+def write_atlas_texture(name, atlas_file, rect):
+    lines = [
+        '[gd_resource type="AtlasTexture" load_steps=2 format=3]',
+        "",
+        f'[ext_resource type="Texture2D" path="{RES_PREFIX}/{atlas_file}" id="1_atlas"]',
+        "",
+        "[resource]",
+        'atlas = ExtResource("1_atlas")',
+        "region = Rect2(%d, %d, %d, %d)" % tuple(rect),
+        "",
+    ]
+    with open(os.path.join(OUTPUT_DIR, f"{name}.tres"), 'w') as f:
+        f.write("\n".join(lines))
+
+def load_manifest():
+    path = os.path.join(OUTPUT_DIR, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def pack_atlases(force=False):
+    t0 = time.perf_counter()
+    sprites = collect_sprites()
+    if not sprites:
+        print("No sprites found.")
+        return None
+
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        hashes = dict(zip(sprites, pool.map(file_hash, sprites.values())))
+
+    settings = {"max_size": MAX_ATLAS_SIZE, "padding": PADDING, "extrude": EXTRUDE}
+    previous = load_manifest()
+    if not force and previous.get("settings") == settings and previous.get("hashes") == hashes:
+        outputs = [a["file"] for a in previous.get("atlases", [])]
+        if EMIT_ATLAS_TEXTURES:
+            outputs += [f"{name}.tres" for name in previous.get("regions", {})]
+        if all(os.path.exists(os.path.join(OUTPUT_DIR, f)) for f in outputs):
+            print(f"All {len(sprites)} sprites unchanged, atlases up to date.")
+            return previous
+
+    # Only the header is read here, pixels are decoded when composing
+    sizes = {}
+    for name, path in sprites.items():
+        with Image.open(path) as img:
+            sizes[name] = img.size
+    padded = {n: (w + 2 * PADDING, h + 2 * PADDING) for n, (w, h) in sizes.items()}
+    bins = pack_sizes(padded)
+
+    # An atlas is re-encoded only if its contents (sprites, hashes, rects) changed
+    old_signatures = {a["file"]: a.get("signature") for a in previous.get("atlases", [])}
+    atlases = []
+    regions = {}
+    jobs = []
+    for i, (bw, bh, placed) in enumerate(bins):
+        atlas_file = f"atlas_{i}.png"
+        entries = []
+        for name in sorted(placed):
+            px, py = placed[name]
+            w, h = sizes[name]
+            rect = (px + PADDING, py + PADDING, w, h)
+            entries.append((name, sprites[name], rect))
+            regions[name] = {"atlas": atlas_file, "rect": list(rect)}
+
+        sig_src = json.dumps([bw, bh, settings, [(n, hashes[n], r) for n, _, r in entries]])
+        signature = hashlib.sha1(sig_src.encode()).hexdigest()
+        atlases.append({"file": atlas_file, "size": [bw, bh], "signature": signature})
+
+        out_path = os.path.join(OUTPUT_DIR, atlas_file)
+        if force or old_signatures.get(atlas_file) != signature or not os.path.exists(out_path):
+            jobs.append((i, bw, bh, entries, out_path))
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for _, out_path in pool.map(compose_atlas, jobs):
+            print(f"  Wrote {out_path}")
+
+    # Drop atlases left over from a previous, larger pack
+    current = {a["file"] for a in atlases}
+    for a in previous.get("atlases", []):
+        stale = os.path.join(OUTPUT_DIR, a["file"])
+        if a["file"] not in current and os.path.exists(stale):
+            os.remove(stale)
+
+    # AtlasTextures of removed/renamed sprites would point at another sprite's rect now
+    for name in previous.get("regions", {}):
+        stale = os.path.join(OUTPUT_DIR, f"{name}.tres")
+        if name not in regions and os.path.exists(stale):
+            os.remove(stale)
+
+    if EMIT_ATLAS_TEXTURES:
+        for name, region in regions.items():
+            write_atlas_texture(name, region["atlas"], region["rect"])
+
+    manifest = {
+        "settings": settings,
+        "hashes": hashes,
+        "atlases": atlases,
+        "regions": regions,
+    }
+    with open(os.path.join(OUTPUT_DIR, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    used = sum(w * h for w, h in sizes.values())
+    total = sum(a["size"][0] * a["size"][1] for a in atlases)
+    print(f"Packed {len(sprites)} sprites into {len(atlases)} atlases "
+          f"({used / total:.0%} occupancy), {len(jobs)} re-encoded in {time.perf_counter() - t0:.1f}s")
+    return manifest
+
+if __name__ == "__main__":
+    pack_atlases(force="--force" in sys.argv)
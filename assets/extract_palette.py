@@ -1,7 +1,12 @@
 from PIL import Image
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import os
+import sys
 import math
+import json
+import time
+import numpy as np
 
 # Allow loading massive images
 Image.MAX_IMAGE_PIXELS = None
@@ -9,6 +14,16 @@ Image.MAX_IMAGE_PIXELS = None
 # Use the original map or a few representative chunks
 INPUT_FILE = "TheMap.png"
 
+# Discovery mode (--discover): full-resolution histogram + clustering
+CONFIG_FILE = "terrain_config.json"
+CHUNK_DIR = "map_chunks" # Pre-sliced TheMap.png, decoded in parallel when present
+PROPOSALS_FILE = "palette_proposals.json"
+NUM_CLUSTERS = 32
+KMEANS_ITERATIONS = 20
+MIN_PROPOSAL_COVERAGE = 0.001 # Fraction of the map an unmatched cluster needs to be proposed
+MAX_ASSIGN_FACTOR = 1.5 # Clusters farther than this x the nearest entry's tolerance stay unclassified (ID 0)
+HIST_BATCH = 16 # Chunks packed per bincount call (amortizes the 16M-bin histogram)
+
 def get_distinct_palette():
     print(f"Scanning {INPUT_FILE} for distinct distinct colors...")
     
@@ -79,5 +94,257 @@ def get_distinct_palette():
     except Exception as e:
         print(f"Error: {e}")
 
+# --- Palette Discovery ---
+
+def pack_rgb(pixels):
+    """(..., 3) uint8 array -> flat uint32 0xRRGGBB keys."""
+    rgb = pixels.reshape(-1, 3).astype(np.uint32)
+    return (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+def unpack_rgb(keys):
+    keys = np.asarray(keys, dtype=np.uint32)
+    return np.stack([(keys >> 16) & 255, (keys >> 8) & 255, keys & 255], axis=1)
+
+def histogram_chunks(paths):
+    """Exact color histogram of a group of chunk images, returned sparse as (keys, counts)."""
+    hist = np.zeros(1 << 24, dtype=np.int64)
+    batch = []
+    for path in paths:
+        with Image.open(path) as img:
+            batch.append(pack_rgb(np.asarray(img.convert("RGB"))))
+        if len(batch) == HIST_BATCH:
+            hist += np.bincount(np.concatenate(batch), minlength=1 << 24)
+            batch = []
+    if batch:
+        hist += np.bincount(np.concatenate(batch), minlength=1 << 24)
+    keys = np.flatnonzero(hist)
+    return keys.astype(np.uint32), hist[keys]
+
+def build_color_histogram():
+    """Full-resolution (keys, counts) over the whole map, from map_chunks or TheMap.png."""
+    hist = np.zeros(1 << 24, dtype=np.int64)
+
+    chunk_files = []
+    if os.path.isdir(CHUNK_DIR):
+        chunk_files = sorted(
+            os.path.join(CHUNK_DIR, f) for f in os.listdir(CHUNK_DIR)
+            if f.startswith("map_") and f.endswith(".png")
+        )
+
+    if chunk_files:
+        print(f"Histogramming {len(chunk_files)} chunks from {CHUNK_DIR}...")
+        workers = os.cpu_count() or 1
+        groups = [chunk_files[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for keys, counts in pool.map(histogram_chunks, groups):
+                hist[keys] += counts
+    else:
+        print(f"Histogramming {INPUT_FILE} at full resolution...")
+        with Image.open(INPUT_FILE) as img:
+            img = img.convert("RGB")
+            width, height = img.size
+            # Strips keep the packed key buffer bounded on the 16384^2 map
+            for top in range(0, height, 1024):
+                strip = np.asarray(img.crop((0, top, width, min(top + 1024, height))))
+                hist += np.bincount(pack_rgb(strip), minlength=1 << 24)
+
+    keys = np.flatnonzero(hist)
+    return keys.astype(np.uint32), hist[keys]
+
+def median_cut(colors, weights, k):
+    """Splits the weighted color cloud into k boxes, returns each box's weighted mean."""
+    boxes = [np.arange(len(colors))]
+    while len(boxes) < k:
+        # Split the box with the largest weighted spread
+        scores = []
+        for idx in boxes:
+            if len(idx) < 2:
+                scores.append(-1.0)
+                continue
+            spread = colors[idx].max(axis=0) - colors[idx].min(axis=0)
+            scores.append(float(spread.max()) * float(weights[idx].sum()))
+        b = int(np.argmax(scores))
+        if scores[b] <= 0:
+            break
+
+        idx = boxes.pop(b)
+        axis = int(np.argmax(colors[idx].max(axis=0) - colors[idx].min(axis=0)))
+        order = idx[np.argsort(colors[idx, axis], kind="stable")]
+        cum = np.cumsum(weights[order])
+        cut = int(np.searchsorted(cum, cum[-1] / 2.0))
+        cut = min(max(cut, 1), len(order) - 1)
+        boxes.append(order[:cut])
+        boxes.append(order[cut:])
+
+    return np.array([np.average(colors[idx], axis=0, weights=weights[idx]) for idx in boxes])
+
+def nearest_center(colors, centers, block=1 << 18):
+    """Index of and distance to the nearest center for every color (blocked to bound memory)."""
+    labels = np.empty(len(colors), dtype=np.int64)
+    dists = np.empty(len(colors), dtype=np.float64)
+    c = centers.astype(np.float64)
+    c_sq = (c * c).sum(axis=1)
+    for start in range(0, len(colors), block):
+        x = colors[start:start + block].astype(np.float64)
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, as one matrix product instead of a (n, k, 3) temporary
+        d2 = c_sq[None, :] - 2.0 * (x @ c.T)
+        lab = np.argmin(d2, axis=1)
+        labels[start:start + block] = lab
+        best = d2[np.arange(len(x)), lab] + (x * x).sum(axis=1)
+        dists[start:start + block] = np.sqrt(np.maximum(best, 0.0))
+    return labels, dists
+
+def weighted_kmeans(colors, weights, k=NUM_CLUSTERS, iterations=KMEANS_ITERATIONS):
+    """Lloyd's k-means over the histogram (each unique color weighted by its pixel count), median-cut seeded."""
+    centers = median_cut(colors, weights, k)
+    w = weights.astype(np.float64)
+    for _ in range(iterations):
+        labels, _ = nearest_center(colors, centers)
+        totals = np.bincount(labels, weights=w, minlength=len(centers))
+        new_centers = centers.copy()
+        for ch in range(3):
+            sums = np.bincount(labels, weights=w * colors[:, ch], minlength=len(centers))
+            np.divide(sums, totals, out=new_centers[:, ch], where=totals > 0)
+        if np.allclose(new_centers, centers, atol=0.25):
+            centers = new_centers
+            break
+        centers = new_centers
+    labels, dists = nearest_center(colors, centers)
+    return centers, labels, dists
+
+def baker_match(colors, terrain_types):
+    """Index into terrain_types.keys() each color matches under terrain_baker's first-hit rule, -1 if none."""
+    match = np.full(len(colors), -1, dtype=np.int64)
+    x = colors.astype(np.float32)
+    for i, data in enumerate(terrain_types.values()):
+        d = np.sqrt(((x - np.array(data["color"], dtype=np.float32)) ** 2).sum(axis=1))
+        match[(match < 0) & (d <= data["tolerance"])] = i
+    return match
+
+def discover_palette(keys=None, counts=None):
+    config = {}
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            config = json.load(f)
+    terrain_types = config.get("terrain_types", {})
+    names = list(terrain_types.keys())
+
+    t0 = time.perf_counter()
+    if keys is None:
+        keys, counts = build_color_histogram()
+    colors = unpack_rgb(keys).astype(np.float64)
+    total = float(counts.sum())
+    print(f"{int(total)} pixels, {len(keys)} unique colors ({time.perf_counter() - t0:.1f}s)")
+
+    centers, labels, _ = weighted_kmeans(colors, counts)
+    match = baker_match(colors, terrain_types)
+    print(f"Clustered into {len(centers)} colors ({time.perf_counter() - t0:.1f}s)")
+
+    unmatched_total = counts[match < 0].sum() / total
+    print(f"\nCurrent config leaves {unmatched_total:.2%} of the map unmatched (baked as ID 0).")
+
+    entries = [(name, np.array(terrain_types[name]["color"], dtype=np.float64)) for name in names]
+    proposals = {}
+    unclassified = {}
+    clusters = []
+    print("\n=== DISCOVERED PALETTE ===")
+    order = np.argsort(-np.bincount(labels, weights=counts, minlength=len(centers)))
+    for c in order:
+        members = labels == c
+        cov = counts[members].sum() / total
+        if cov == 0:
+            continue
+        # Only the pixels the config (plus proposals accepted so far) still misses matter
+        missed = np.flatnonzero(members & (match < 0))
+        unmatched = counts[missed].sum() / total
+
+        # Every cluster is mapped to its nearest existing entry, matched or not
+        near_name, near_dist = None, float("inf")
+        for name, color in entries:
+            d = float(np.sqrt(((centers[c] - color) ** 2).sum()))
+            if d < near_dist:
+                near_name, near_dist = name, d
+
+        line = f"  RGB: {tuple(int(round(v)) for v in centers[c])} - Coverage: {cov:.2%}"
+        if near_name:
+            line += f" - Nearest: {near_name} (dist {near_dist:.0f}, tol {terrain_types[near_name]['tolerance']})"
+        line += f" - Unmatched: {unmatched:.2%}"
+        print(line)
+        clusters.append({
+            "center": [int(round(v)) for v in centers[c]],
+            "coverage": round(cov, 6),
+            "unmatched": round(unmatched, 6),
+            "nearest": near_name,
+            "distance": round(near_dist, 2) if near_name else None,
+        })
+
+        if unmatched < MIN_PROPOSAL_COVERAGE:
+            continue
+
+        # Color and tolerance come from the unmatched members alone; the cluster
+        # center is pulled towards colors the config already handles
+        missed_w = counts[missed].astype(np.float64)
+        center = (colors[missed] * missed_w[:, None]).sum(axis=0) / missed_w.sum()
+        rgb = [int(round(v)) for v in center]
+        member_d = np.sqrt(((colors[missed] - rgb) ** 2).sum(axis=1))
+        sort = np.argsort(member_d)
+        cum = np.cumsum(missed_w[sort])
+        # Tolerance covering 90% of those pixels, like the hand-tuned entries
+        tol = float(member_d[sort][np.searchsorted(cum, 0.9 * cum[-1])])
+        tol = int(min(max(round(tol), 15), 50))
+
+        # New entries are appended to the config, so the baker's first-hit rule only
+        # hands them pixels nothing earlier matched (in any cluster)
+        pool = np.flatnonzero(match < 0)
+        candidate = {"color": rgb, "tolerance": tol}
+        hit = pool[baker_match(colors[pool], {"candidate": candidate}) >= 0]
+        recovered = counts[hit].sum() / total
+
+        entry = {
+            "color": rgb,
+            "tolerance": tol,
+            "coverage": round(cov, 6),
+            "unmatched": round(unmatched, 6),
+            "recovered": round(recovered, 6),
+        }
+
+        # Far from every entry (e.g. the grassland greens): report it, but don't guess an ID
+        if near_name is None or near_dist > terrain_types[near_name]["tolerance"] * MAX_ASSIGN_FACTOR:
+            unclassified[f"UNCLASSIFIED_{len(unclassified) + 1}"] = entry
+            continue
+
+        if recovered < MIN_PROPOSAL_COVERAGE:
+            print(f"    Skipped near {near_name}: tol {tol} would only recover {recovered:.3%} of the map")
+            continue
+
+        # Same key order as terrain_config.json entries
+        proposals[f"{near_name}_AUTO_{len(proposals) + 1}"] = {
+            "id": terrain_types[near_name]["id"],
+            "color": rgb,
+            "tolerance": tol,
+            "description": f"Proposed by palette discovery near {near_name}",
+            "coverage": entry["coverage"],
+            "unmatched": entry["unmatched"],
+            "recovered": entry["recovered"],
+        }
+        match[hit] = len(names) + len(proposals) - 1
+
+    print(f"\n=== PROPOSED ENTRIES ({len(proposals)}) ===")
+    for name, data in proposals.items():
+        print(f"  {name}: id {data['id']}, color {tuple(data['color'])}, tol {data['tolerance']} - {data['recovered']:.2%} of map recovered")
+
+    print(f"\n=== UNCLASSIFIED CLUSTERS ({len(unclassified)}) - baked as ID 0 ===")
+    for name, data in unclassified.items():
+        print(f"  {name}: color {tuple(data['color'])}, tol {data['tolerance']} - {data['unmatched']:.2%} of map "
+              f"({data['recovered']:.2%} within tol)")
+
+    with open(PROPOSALS_FILE, 'w') as f:
+        json.dump({"terrain_types": proposals, "unclassified": unclassified, "clusters": clusters}, f, indent=4)
+    print(f"\nSaved proposals to {PROPOSALS_FILE} ({time.perf_counter() - t0:.1f}s). Review before merging into {CONFIG_FILE}.")
+    return proposals
+
 if __name__ == "__main__":
-    get_distinct_palette()
+    if "--discover" in sys.argv:
+        discover_palette()
+    else:
+        get_distinct_palette()
@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from terrain_map import CHUNK_SIZE, GRID_SIZE
+from extract_palette import pack_rgb, discover_palette
+
+# Increase limit for large images
+Image.MAX_IMAGE_PIXELS = None
+
+# Config
+CONFIG_FILE = "terrain_config.json"
+INPUT_FILE = "TheMap.png"
+CHUNK_DIR = "map_chunks" # Pre-sliced TheMap.png (slicer.py), preferred when present
+MAP_SIZE = CHUNK_SIZE * GRID_SIZE
+
+# Single decode pass over the map feeding every registered analyzer.
+#
+# Each visitor gets map(coord, pixels) once per 1024x1024 RGB chunk (in a worker
+# process, so it must return something small and picklable) and reduce(partials)
+# once at the end with {coord: partial} for every chunk. The standalone scripts
+# (analyze_map.py, analyze_missed_terrain.py, extract_palette.py, find_biomes.py)
+# each decode TheMap.png on their own; the visitors below reproduce their reports.
+
+def load_config():
+    if not os.path.exists(CONFIG_FILE):
+        print(f"Warning: {CONFIG_FILE} not found. Using defaults.")
+        return {}
+    with open(CONFIG_FILE, 'r') as f:
+        return json.load(f)
+
+def color_distance(pixels, color):
+    # Euclidean distance, vectorized over an (..., 3) array
+    diff = pixels.astype(np.float32) - np.asarray(color, dtype=np.float32)
+    return np.sqrt((diff * diff).sum(axis=-1))
+
+def nearest_sample(pixels, target_res):
+    """The chunk's share of a whole-map Image.resize((target_res, target_res), NEAREST)."""
+    step = MAP_SIZE // target_res
+    return pixels[step // 2::step, step // 2::step]
+
+def count_colors(pixels):
+    """Counter of RGB tuples, built from packed keys instead of a Python loop."""
+    keys, counts = np.unique(pack_rgb(pixels), return_counts=True)
+    return Counter({
+        (int(k >> 16), int((k >> 8) & 255), int(k & 255)): int(c)
+        for k, c in zip(keys, counts)
+    })
+
+class MapVisitor:
+    name = "visitor"
+
+    def map(self, coord, pixels):
+        raise NotImplementedError
+
+    def reduce(self, partials):
+        raise NotImplementedError
+
+class WaterGapVisitor(MapVisitor):
+    """analyze_map.py: water near misses and diagonal gaps at 1024x1024."""
+    name = "analyze_map"
+    target_res = 1024
+
+    def __init__(self, config):
+        water_def = config.get("terrain_types", {}).get("WATER")
+        self.water_color = tuple(water_def["color"]) if water_def else None
+        self.water_tol = water_def["tolerance"] if water_def else 0
+
+    def map(self, coord, pixels):
+        if self.water_color is None:
+            return None
+        dist = color_distance(nearest_sample(pixels, self.target_res), self.water_color)
+        water = dist <= self.water_tol
+        near = int(np.count_nonzero(~water & (dist <= self.water_tol * 1.5)))
+        # Gaps need the neighbouring chunks, so hand the grid to reduce
+        return np.packbits(water, axis=1), water.shape, near
+
+    def reduce(self, partials):
+        if self.water_color is None:
+            print("Config missing WATER definition. Cannot analyze rivers specifically.")
+            return None
+
+        cell = self.target_res * CHUNK_SIZE // MAP_SIZE
+        grid = np.zeros((self.target_res, self.target_res), dtype=bool)
+        near_misses = 0
+        for (cx, cy), (packed, shape, near) in partials.items():
+            grid[cy * cell:cy * cell + shape[0], cx * cell:cx * cell + shape[1]] = \
+                np.unpackbits(packed, axis=1, count=shape[1]).astype(bool)
+            near_misses += near
+
+        tl, tr = grid[:-1, :-1], grid[:-1, 1:]
+        bl, br = grid[1:, :-1], grid[1:, 1:]
+        diagonal_gaps = int(np.count_nonzero(tl & br & ~tr & ~bl) + np.count_nonzero(tr & bl & ~tl & ~br))
+        total_water = int(np.count_nonzero(grid))
+
+        print("-" * 40)
+        print("ANALYSIS REPORT")
+        print("-" * 40)
+        print(f"Total Water Pixels: {total_water}")
+        print(f"Near Misses:        {near_misses} (Pixels within 1.5x tolerance)")
+        print(f"Diagonal Gaps:      {diagonal_gaps} (Potential crossings)")
+
+        if near_misses > 0:
+            print("\nSUGGESTION: Consider increasing WATER tolerance slightly (e.g. +5 or +10)")
+            print("            or enable 'Fill Holes' in baker.")
+
+        if diagonal_gaps > 0:
+            print("\nSUGGESTION: Enable 'Stitch Diagonals' in baker to close these gaps.")
+
+        return {"total_water": total_water, "near_misses": near_misses, "diagonal_gaps": diagonal_gaps}
+
+class MissedTerrainVisitor(MapVisitor):
+    """analyze_missed_terrain.py: unmatched shades at 2048x2048 and which biome nearly claimed them."""
+    name = "analyze_missed_terrain"
+    target_res = 2048
+
+    def __init__(self, config):
+        self.targets = [
+            (key, tuple(data["color"]), data["tolerance"])
+            for key, data in config.get("terrain_types", {}).items()
+        ]
+
+    def map(self, coord, pixels):
+        sample = nearest_sample(pixels, self.target_res).reshape(-1, 3)
+        dists = [color_distance(sample, color) for _, color, _ in self.targets]
+
+        matched = np.zeros(len(sample), dtype=bool)
+        for (_, _, tol), d in zip(self.targets, dists):
+            matched |= d <= tol
+        missed = ~matched
+
+        by_biome = {}
+        for (name, _, tol), d in zip(self.targets, dists):
+            # 3x tolerance window to catch the "shades" user mentioned
+            close = missed & (d <= tol * 3.0)
+            if close.any():
+                by_biome[name] = count_colors(sample[close])
+
+        return count_colors(sample[missed]), by_biome
+
+    def reduce(self, partials):
+        global_missed = Counter()
+        missed_by_biome = {name: Counter() for name, _, _ in self.targets}
+        for missed, by_biome in partials.values():
+            global_missed.update(missed)
+            for name, counter in by_biome.items():
+                missed_by_biome[name].update(counter)
+
+        print("\n=== GLOBAL UNMATCHED COLORS (Top 10) ===")
+        for color, count in global_missed.most_common(10):
+            print(f"  Color {color} - Count: {count}")
+
+        print("\n=== MISSED SHADES BY BIOME ===")
+
+        found_suggestions = {}
+        for name, counter in missed_by_biome.items():
+            print(f"\n[{name}] Missed Candidate Shades:")
+            if not counter:
+                print("  (None found in 3x range)")
+                continue
+
+            suggestions = []
+            for color, count in counter.most_common(5):
+                print(f"  Color {color} - Count: {count}")
+                suggestions.append(color)
+            found_suggestions[name] = suggestions
+
+        return found_suggestions
+
+class PaletteVisitor(MapVisitor):
+    """extract_palette.py: heuristic palette groups over a 2048x2048 sample."""
+    name = "extract_palette"
+    target_res = 2048
+
+    def map(self, coord, pixels):
+        return count_colors(nearest_sample(pixels, self.target_res))
+
+    def reduce(self, partials):
+        counts = Counter()
+        for counter in partials.values():
+            counts.update(counter)
+
+        print(f"Found {len(counts)} unique colors in sample.")
+
+        interesting_colors = {}
+        for color, count in counts.items():
+            r, g, b = color
+            lum = 0.299*r + 0.587*g + 0.114*b
+            sat = max(r, g, b) - min(r, g, b)
+
+            if lum > 200 and sat < 20:
+                group = "Potential Snow"
+            elif r > b + 20 and g > b + 10 and lum > 50:
+                group = "Potential Sand/Earth"
+            elif b > r + 10 and b > g + 10:
+                group = "Potential Water"
+            elif lum < 20:
+                group = "Potential Void"
+            else:
+                group = "Other/Grass/Rock"
+
+            if group not in interesting_colors:
+                interesting_colors[group] = Counter()
+            interesting_colors[group][color] = count
+
+        print("\n=== PALETTE REPORT ===")
+        for group, counter in interesting_colors.items():
+            print(f"\n[{group}] Top 5:")
+            for color, count in counter.most_common(5):
+                print(f"  RGB: {color} - Count: {count}")
+
+        return interesting_colors
+
+class PaletteDiscoveryVisitor(MapVisitor):
+    """extract_palette.py --discover: clusters the full-resolution color histogram."""
+    name = "discover_palette"
+
+    def map(self, coord, pixels):
+        keys, counts = np.unique(pack_rgb(pixels), return_counts=True)
+        return keys.astype(np.uint32), counts
+
+    def reduce(self, partials):
+        hist = np.zeros(1 << 24, dtype=np.int64)
+        for keys, counts in partials.values():
+            hist[keys] += counts
+        keys = np.flatnonzero(hist)
+        return discover_palette(keys.astype(np.uint32), hist[keys])
+
+class BiomeVisitor(MapVisitor):
+    """find_biomes.py: dominant colors of a few representative chunks."""
+    name = "find_biomes"
+
+    # Scan a diagonal and corners to find biome variation
+    chunks_to_scan = {(0, 0), (0, 15), (15, 0), (15, 15), (8, 8), (4, 4), (12, 4)}
+
+    def map(self, coord, pixels):
+        if coord not in self.chunks_to_scan:
+            return None
+        # Resize to minimal thumb to get dominant vibes
+        thumb = Image.fromarray(pixels).resize((100, 100), Image.Resampling.NEAREST)
+        return count_colors(np.asarray(thumb))
+
+    def reduce(self, partials):
+        unique_colors = Counter()
+        for counter in partials.values():
+            if counter:
+                unique_colors.update(counter)
+
+        print("\nTop 30 Global Colors (excluding near-blacks):")
+        visible_colors = {k: v for k, v in unique_colors.items() if sum(k) > 50}
+        sorted_colors = sorted(visible_colors.items(), key=lambda x: x[1], reverse=True)
+        for color, count in sorted_colors[:30]:
+            print(f"Color {color} - Count: {count}")
+
+        return sorted_colors[:30]
+
+def default_visitors(config, discover=False):
+    visitors = [
+        WaterGapVisitor(config),
+        MissedTerrainVisitor(config),
+        PaletteVisitor(),
+        BiomeVisitor(),
+    ]
+    if discover:
+        visitors.append(PaletteDiscoveryVisitor())
+    return visitors
+
+# --- Driver ---
+
+_worker_visitors = None
+
+def _init_worker(visitors):
+    global _worker_visitors
+    _worker_visitors = visitors
+
+def _visit_pixels(coord, pixels):
+    return coord, {v.name: v.map(coord, pixels) for v in _worker_visitors}
+
+def _visit_file(job):
+    coord, path = job
+    with Image.open(path) as img:
+        pixels = np.asarray(img.convert("RGB"))
+    return _visit_pixels(coord, pixels)
+
+def _visit_array(job):
+    coord, pixels = job
+    return _visit_pixels(coord, pixels)
+
+def _chunk_files():
+    if not os.path.isdir(CHUNK_DIR):
+        return []
+    jobs = []
+    for f in os.listdir(CHUNK_DIR):
+        if not (f.startswith("map_") and f.endswith(".png")):
+            continue
+        parts = f.replace("map_", "").replace(".png", "").split("_")
+        if len(parts) == 2:
+            jobs.append(((int(parts[0]), int(parts[1])), os.path.join(CHUNK_DIR, f)))
+    return sorted(jobs)
+
+def _crop_jobs(img):
+    # Chunks of the one decoded TheMap.png, yielded lazily so only in-flight crops are copied
+    width, height = img.size
+    for x in range(width // CHUNK_SIZE):
+        for y in range(height // CHUNK_SIZE):
+            box = (x * CHUNK_SIZE, y * CHUNK_SIZE, (x + 1) * CHUNK_SIZE, (y + 1) * CHUNK_SIZE)
+            yield (x, y), np.asarray(img.crop(box))
+
+def _bounded_map(pool, fn, jobs, window):
+    # Like pool.map, but keeps at most `window` chunks in flight so decoded
+    # pixels never pile up in memory faster than the visitors consume them
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def run_audit(visitors, workers=None):
+    """Decodes the map once and runs every visitor over it. Returns {name: reduce() result}."""
+    partials = {v.name: {} for v in visitors}
+    window = 2 * (workers or os.cpu_count() or 1)
+    t0 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(visitors,)) as pool:
+        jobs = _chunk_files()
+        if jobs:
+            print(f"Streaming {len(jobs)} chunks from {CHUNK_DIR} through {len(visitors)} analyzers...")
+            results = _bounded_map(pool, _visit_file, jobs, window)
+        elif os.path.exists(INPUT_FILE):
+            print(f"Loading {INPUT_FILE} once for {len(visitors)} analyzers...")
+            img = Image.open(INPUT_FILE).convert("RGB")
+            results = _bounded_map(pool, _visit_array, _crop_jobs(img), window)
+        else:
+            print(f"Error: neither {CHUNK_DIR}/ nor {INPUT_FILE} found.")
+            return {}
+
+        for i, (coord, chunk_partials) in enumerate(results):
+            for name, partial in chunk_partials.items():
+                partials[name][coord] = partial
+            if i % 32 == 0:
+                print(f"Progress: {i}")
+
+    print(f"Decode + map pass done in {time.perf_counter() - t0:.1f}s")
+
+    results = {}
+    for v in visitors:
+        print(f"\n##### {v.name} #####")
+        results[v.name] = v.reduce(partials[v.name])
+    print(f"\nAudit complete in {time.perf_counter() - t0:.1f}s")
+    return results
+
+def main():
+    config = load_config()
+    run_audit(default_visitors(config, discover="--discover" in sys.argv))
+
+if __name__ == "__main__":
+    main()
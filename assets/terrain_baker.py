@@ -1,6 +1,9 @@
 import os
 import json
 import math
+import time
+import queue
+import threading
 from PIL import Image
 
 # Config
@@ -15,6 +18,25 @@ DEBUG_COLORS = {
     150: (0, 0, 255, 180)     # Water: Blue mostly solid
 }
 
+# PNG zlib level per output (0-9). Data chunks ship with the game, debug output is throwaway.
+DATA_COMPRESS_LEVEL = 6
+DEBUG_COMPRESS_LEVEL = 1
+CLEARANCE_COMPRESS_LEVEL = 6 # clear_X_Y.png / reach_X_Y.png, also shipped
+
+# Pipeline: decode threads -> classify (main thread) -> encode/write threads.
+# PIL releases the GIL while decoding and compressing, so disk and zlib work
+# overlaps with the pure-Python classification instead of adding to it.
+DECODE_WORKERS = 2
+ENCODE_WORKERS = 2
+QUEUE_DEPTH = 4          # Max chunks waiting between two stages (backpressure)
+MEMORY_CEILING_MB = 512  # Max pixel data held by chunks in flight across all stages
+
+# Also write map_data/terrain_sparse.bin (uniform/quadtree/RLE chunks, see terrain_sparse.py)
+SPARSE_OUTPUT = True
+
+# Also write map_data/clear_X_Y.png / reach_X_Y.png distance fields (see terrain_clearance.py)
+CLEARANCE_OUTPUT = True
+
 def load_config():
     with open(CONFIG_FILE, 'r') as f:
         return json.load(f)
@@ -26,14 +48,27 @@ def color_distance(c1, c2):
     b = c1[2] - c2[2]
     return math.sqrt(r*r + g*g + b*b)
 
-def process_chunk(chunk_path, output_path, debug_path, config):
+def load_chunk(chunk_path):
+    # convert() forces the full decode, so callers get pixels, not a lazy file handle
+    with Image.open(chunk_path) as img:
+        return img.convert("RGB")
+
+def process_chunk(chunk_path, output_path, config):
+    """Bakes one chunk file on its own. Returns its debug image (None if disabled or skipped)
+    so callers can paste it wherever they want; nothing is written to DEBUG_DIR."""
     print(f"Baking {chunk_path}...")
     try:
-        img = Image.open(chunk_path).convert("RGB")
+        img = load_chunk(chunk_path)
     except Exception as e:
         print(f"Skipping {chunk_path}: {e}")
-        return
+        return None
+
+    out_img, debug_img = classify_chunk(img, config)
+    out_img.save(output_path, compress_level=DATA_COMPRESS_LEVEL)
+    return debug_img
 
+def classify_chunk(img, config):
+    """Bakes one decoded RGB chunk. Returns (data L image, debug RGBA image or None)."""
     # Resize to target size (Data is lower res than Visuals)
     target_size = config.get("target_size", 512)
     
@@ -241,73 +276,146 @@ def process_chunk(chunk_path, output_path, debug_path, config):
                 
     print(f"  Fixed {changes} holes and {diag_fixes} diagonal gaps.")
 
-    out_img.save(output_path)
-    
-    if DEBUG_ENABLED:
-        debug_img.save(debug_path)
+    return out_img, (debug_img if DEBUG_ENABLED else None)
 
-def stitch_debug_map(config):
-    if not DEBUG_ENABLED: return
-    
-    print("Stitching full debug map...")
-    
-    # 16x16 grid approximation from file list or hardcoded
-    # We know the grid size is implicitly defined by file names, but let's be dynamic
-    # Find max X and Y
-    in_dir = config["output_dir"] # Use data dir, but we actually need debug files
-    # Actually we saved debug images to DEBUG_DIR
-    
-    files = [f for f in os.listdir(DEBUG_DIR) if f.startswith("debug_") and f.endswith(".png")]
-    if not files:
-        print("No debug chunks found to stitch.")
-        return
+class ByteBudget:
+    """Blocks producers while the chunks in flight hold more than `limit` bytes."""
 
-    max_x = 0
-    max_y = 0
-    
-    for f in files:
-        # debug_10_5.png
-        parts = f.replace("debug_", "").replace(".png", "").split("_")
-        if len(parts) == 2:
-            x, y = int(parts[0]), int(parts[1])
-            max_x = max(max_x, x)
-            max_y = max(max_y, y)
-            
-    grid_w = max_x + 1
-    grid_h = max_y + 1
-    
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, n):
+        with self.cond:
+            # A single oversized chunk is still let through when nothing else is in flight
+            while self.used > 0 and self.used + n > self.limit:
+                self.cond.wait()
+            self.used += n
+
+    def release(self, n):
+        with self.cond:
+            self.used -= n
+            self.cond.notify_all()
+
+_DONE = object()
+
+def chunk_coord(filename):
+    # map_10_5.png -> (10, 5), None for anything else
+    parts = filename.replace("map_", "").replace(".png", "").split("_")
+    if len(parts) == 2 and all(p.isdigit() for p in parts):
+        return int(parts[0]), int(parts[1])
+    return None
+
+def estimate_chunk_bytes(path, target_size):
+    # Source RGB + resized RGB + L data + RGBA debug; only the header is read here
+    with Image.open(path) as img:
+        w, h = img.size
+    return w * h * 3 + target_size * target_size * (3 + 1 + 4)
+
+def run_pipeline(jobs, config, debug_canvas=None):
+    """Bakes jobs [(in_path, out_path, coord)] with overlapped decode/classify/encode.
+
+    Returns ({coord: data image} for every chunk written, stage busy times in seconds).
+    """
     target_size = config.get("target_size", 512)
-    full_w = grid_w * target_size
-    full_h = grid_h * target_size
-    
-    # Create massive canvas
-    # 16 * 512 = 8192. 8192x8192 is large but standard for texture (64MB raw, compressed PNG fine)
-    full_img = Image.new("RGBA", (full_w, full_h))
-    
-    for f in files:
-        parts = f.replace("debug_", "").replace(".png", "").split("_")
-        x, y = int(parts[0]), int(parts[1])
-        
-        chunk_path = os.path.join(DEBUG_DIR, f)
-        try:
-            chunk = Image.open(chunk_path)
-            full_img.paste(chunk, (x * target_size, y * target_size))
-        except Exception as e:
-            print(f"Failed to stitch {f}: {e}")
-            
-    out_path = os.path.join(DEBUG_DIR, "FULL_DEBUG_MAP.png")
-    full_img.save(out_path)
-    print(f"Saved Unified Debug Map: {out_path} ({full_w}x{full_h})")
-    
-    # Clean up individual debug chunks
-    print("Cleaning up individual debug chunks...")
-    for f in files:
-        file_path = os.path.join(DEBUG_DIR, f)
-        try:
-            os.remove(file_path)
-        except OSError as e:
-            print(f"Error deleting {file_path}: {e}")
-    print("Cleanup complete.")
+    budget = ByteBudget(MEMORY_CEILING_MB * 1024 * 1024)
+    compute_q = queue.Queue(maxsize=QUEUE_DEPTH)
+    write_q = queue.Queue(maxsize=QUEUE_DEPTH)
+
+    job_iter = iter(jobs)
+    job_lock = threading.Lock()
+    stats_lock = threading.Lock()
+    canvas_lock = threading.Lock()
+    stage_time = {"decode": 0.0, "compute": 0.0, "encode": 0.0}
+    baked = {}
+    errors = []
+
+    def add_time(stage, t0):
+        with stats_lock:
+            stage_time[stage] += time.perf_counter() - t0
+
+    def decode_worker():
+        while True:
+            with job_lock:
+                job = next(job_iter, None)
+            if job is None:
+                compute_q.put(_DONE)
+                return
+
+            in_path = job[0]
+            try:
+                cost = estimate_chunk_bytes(in_path, target_size)
+                budget.acquire(cost)
+            except Exception as e:
+                print(f"Skipping {in_path}: {e}")
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                img = load_chunk(in_path)
+            except Exception as e:
+                print(f"Skipping {in_path}: {e}")
+                budget.release(cost)
+                continue
+            add_time("decode", t0)
+            compute_q.put((job, img, cost))
+
+    def write_worker():
+        while True:
+            item = write_q.get()
+            if item is _DONE:
+                return
+
+            (in_path, out_path, coord), out_img, debug_img, cost = item
+            t0 = time.perf_counter()
+            try:
+                out_img.save(out_path, compress_level=DATA_COMPRESS_LEVEL)
+                baked[coord] = out_img
+                if debug_canvas is not None and debug_img is not None and coord is not None:
+                    with canvas_lock:
+                        debug_canvas.paste(debug_img, (coord[0] * target_size, coord[1] * target_size))
+            except Exception as e:
+                errors.append((out_path, e))
+            finally:
+                budget.release(cost)
+                add_time("encode", t0)
+
+    decoders = [threading.Thread(target=decode_worker, daemon=True) for _ in range(DECODE_WORKERS)]
+    writers = [threading.Thread(target=write_worker, daemon=True) for _ in range(ENCODE_WORKERS)]
+    for t in decoders + writers:
+        t.start()
+
+    # Classification is pure Python and holds the GIL, so it stays on this thread
+    finished = 0
+    done = 0
+    try:
+        while finished < len(decoders):
+            item = compute_q.get()
+            if item is _DONE:
+                finished += 1
+                continue
+
+            job, img, cost = item
+            print(f"Baking {job[0]}...")
+            t0 = time.perf_counter()
+            out_img, debug_img = classify_chunk(img, config)
+            add_time("compute", t0)
+            del img
+            write_q.put((job, out_img, debug_img, cost))
+
+            if done % 10 == 0:
+                print(f"Progress: {done}/{len(jobs)}")
+            done += 1
+    finally:
+        for _ in writers:
+            write_q.put(_DONE)
+        for t in writers:
+            t.join()
+
+    for out_path, e in errors:
+        print(f"Failed to write {out_path}: {e}")
+    return baked, stage_time
 
 def main():
     if not os.path.exists(CONFIG_FILE):
@@ -317,6 +425,7 @@ def main():
     config = load_config()
     in_dir = config["input_dir"]
     out_dir = config["output_dir"]
+    target_size = config.get("target_size", 512)
     
     # Ensure directories exist
     if not os.path.exists(out_dir):
@@ -330,22 +439,48 @@ def main():
     total = len(files)
     print(f"Found {total} chunks to process with Debug={DEBUG_ENABLED}.")
     
-    for i, filename in enumerate(files):
+    jobs = []
+    for filename in files:
         in_path = os.path.join(in_dir, filename)
-        out_name = filename.replace("map_", "data_")
-        out_path = os.path.join(out_dir, out_name)
-        
-        debug_name = filename.replace("map_", "debug_")
-        debug_path = os.path.join(DEBUG_DIR, debug_name)
-        
-        process_chunk(in_path, out_path, debug_path, config)
-        
-        if i % 10 == 0:
-            print(f"Progress: {i}/{total}")
-            
-    # Stitch
-    if DEBUG_ENABLED:
-        stitch_debug_map(config)
+        out_path = os.path.join(out_dir, filename.replace("map_", "data_"))
+        jobs.append((in_path, out_path, chunk_coord(filename)))
+
+    # Debug chunks go straight into the full map instead of round-tripping through DEBUG_DIR
+    debug_canvas = None
+    coords = [c for _, _, c in jobs if c is not None]
+    if DEBUG_ENABLED and coords:
+        grid_w = max(c[0] for c in coords) + 1
+        grid_h = max(c[1] for c in coords) + 1
+        debug_canvas = Image.new("RGBA", (grid_w * target_size, grid_h * target_size))
+
+    t0 = time.perf_counter()
+    baked, stage_time = run_pipeline(jobs, config, debug_canvas)
+    wall = time.perf_counter() - t0
+    print(f"Baked {len(baked)}/{total} chunks in {wall:.1f}s "
+          f"(busy: decode {stage_time['decode']:.1f}s, classify {stage_time['compute']:.1f}s, "
+          f"encode {stage_time['encode']:.1f}s)")
+
+    if SPARSE_OUTPUT:
+        from terrain_sparse import build_pack, KIND_UNIFORM, OUTPUT_FILE as SPARSE_FILE
+        sparse_path = os.path.join(out_dir, SPARSE_FILE)
+        # Reuse the chunks still in memory; anything not baked this run is read from disk
+        chunks = {c: img for c, img in baked.items() if c is not None}
+        stats = build_pack(out_dir, sparse_path, chunks)
+        print(f"Saved sparse terrain pack: {sparse_path} ({os.path.getsize(sparse_path) // 1024} KB, "
+              f"{stats[KIND_UNIFORM]} uniform chunks)")
+
+    if CLEARANCE_OUTPUT:
+        from terrain_clearance import bake_clearance, MAX_DISTANCE
+        t0 = time.perf_counter()
+        chunks = {c: img for c, img in baked.items() if c is not None}
+        near = bake_clearance(out_dir, chunks, compress_level=CLEARANCE_COMPRESS_LEVEL)
+        print(f"Saved clearance fields in {time.perf_counter() - t0:.1f}s "
+              f"({near} walkable cells within {MAX_DISTANCE}px of water)")
+
+    if debug_canvas is not None:
+        out_path = os.path.join(DEBUG_DIR, "FULL_DEBUG_MAP.png")
+        debug_canvas.save(out_path, compress_level=DEBUG_COMPRESS_LEVEL)
+        print(f"Saved Unified Debug Map: {out_path} ({debug_canvas.width}x{debug_canvas.height})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,224 @@
+import os
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from terrain_map import (TerrainMap, CHUNK_SIZE, GRID_SIZE, CONFIG_FILE, DEFAULT_CACHE_BYTES,
+                         is_impassable, load_config)
+
+# Per-chunk distance fields baked next to map_data/data_X_Y.png, same size and
+# cell mapping, so a placement or GridMasker check is one lookup instead of a
+# neighbourhood scan:
+#   clear_X_Y.png  world px from each cell centre to the nearest impassable cell centre
+#   reach_X_Y.png  world px from each cell centre to the nearest walkable cell centre
+# Values are floored to whole pixels and saturate at MAX_DISTANCE, so a stored
+# value v means the true distance is in [v, v + 1), or >= MAX_DISTANCE at 255.
+# Missing chunks read as walkable, like MapLoader. Outside the grid there is no
+# obstacle for the clear field, but nothing walkable for the reach field either,
+# so nearest_walkable never leads off the map.
+
+CLEARANCE_PREFIX = "clear_"
+REACH_PREFIX = "reach_"
+
+MAX_DISTANCE = 255    # World px, the uint8 ceiling
+WALKABLE_DISTANCE = True # Also bake reach_X_Y.png (used by nearest_walkable)
+WORKERS = None
+COMPRESS_LEVEL = 6    # PNG zlib level (0-9) for both fields; terrain_baker passes its own
+
+def halo_cells(cell_size):
+    # Any target closer than MAX_DISTANCE lies within this many cells on each axis
+    return math.ceil(MAX_DISTANCE / cell_size)
+
+def quantize(dist2, cell_size):
+    """Squared distance in cells -> stored uint8 world px."""
+    px = np.floor(np.sqrt(dist2) * cell_size)
+    return np.minimum(px, MAX_DISTANCE).astype(np.uint8)
+
+def distance_field(targets, halo, cell_size):
+    """Exact Euclidean distance from each core cell to the nearest target cell.
+
+    targets is a bool window carrying `halo` cells of neighbouring chunks on
+    every side, enough to see any target within MAX_DISTANCE. Columns are
+    scanned first, then each row takes the min over horizontal offsets.
+    """
+    h = targets.shape[0] - 2 * halo
+    w = targets.shape[1] - 2 * halo
+    if targets[halo:halo + h, halo:halo + w].all():
+        return np.zeros((h, w), dtype=np.uint8)
+    if not targets.any():
+        return np.full((h, w), MAX_DISTANCE, dtype=np.uint8)
+
+    # Vertical distance to the nearest target in the same column, capped past the halo
+    far = halo + 1
+    g = np.empty(targets.shape, dtype=np.int32)
+    run = np.full(targets.shape[1], far, dtype=np.int32)
+    for i in range(targets.shape[0]):
+        run = np.where(targets[i], 0, np.minimum(run + 1, far))
+        g[i] = run
+    run = np.full(targets.shape[1], far, dtype=np.int32)
+    for i in range(targets.shape[0] - 1, halo - 1, -1):
+        run = np.where(targets[i], 0, np.minimum(run + 1, far))
+        if i < halo + h:
+            np.minimum(g[i], run, out=g[i])
+
+    g2 = g[halo:halo + h] ** 2
+    d2 = g2[:, halo:halo + w].copy()
+    for dx in range(1, halo + 1):
+        np.minimum(d2, g2[:, halo - dx:halo - dx + w] + dx * dx, out=d2)
+        np.minimum(d2, g2[:, halo + dx:halo + dx + w] + dx * dx, out=d2)
+    return quantize(d2, cell_size)
+
+def field_chunk(job):
+    window, walk_window, halo, cell_size, clear_path, reach_path, level = job
+    clear = distance_field(window, halo, cell_size)
+    Image.fromarray(clear, "L").save(clear_path, compress_level=level)
+    if reach_path is not None:
+        reach = distance_field(walk_window, halo, cell_size)
+        Image.fromarray(reach, "L").save(reach_path, compress_level=level)
+    core = window[halo:-halo, halo:-halo]
+    return int(np.count_nonzero(~core & (clear < MAX_DISTANCE)))
+
+def bake_clearance(data_dir, chunks=None, walkable=WALKABLE_DISTANCE, workers=WORKERS,
+                   compress_level=COMPRESS_LEVEL):
+    """Writes clear_X_Y.png (and reach_X_Y.png) for every chunk of the grid.
+
+    chunks optionally maps (cx, cy) to chunk images/arrays already in memory
+    (e.g. straight from the baker), which are used instead of re-reading the PNG.
+    Returns the number of walkable cells within MAX_DISTANCE of water, or None
+    if nothing has been baked.
+    """
+    chunks = chunks or {}
+    terrain = TerrainMap(data_dir)
+    masks = {}
+    for cy in range(GRID_SIZE):
+        for cx in range(GRID_SIZE):
+            data = chunks.get((cx, cy))
+            data = terrain.get_chunk(cx, cy) if data is None else np.asarray(data, dtype=np.uint8)
+            if data is not None:
+                masks[(cx, cy)] = is_impassable(data)
+    if not masks:
+        return None
+
+    shapes = {m.shape for m in masks.values()}
+    if len(shapes) > 1:
+        raise ValueError(f"Chunks baked at mixed resolutions: {sorted(shapes)}")
+    cells = shapes.pop()[0]
+    cell_size = CHUNK_SIZE / cells
+    halo = halo_cells(cell_size)
+
+    # Padded whole-map masks, so every chunk's halo is a plain slice across the seams.
+    # The padding is neither impassable nor walkable: only map cells are targets.
+    full = np.zeros((GRID_SIZE * cells + 2 * halo,) * 2, dtype=bool)
+    walk = np.zeros_like(full)
+    walk[halo:-halo, halo:-halo] = True
+    for (cx, cy), m in masks.items():
+        core = (slice(halo + cy * cells, halo + (cy + 1) * cells), slice(halo + cx * cells, halo + (cx + 1) * cells))
+        full[core] = m
+        walk[core] = ~m
+
+    # Missing chunks get fields too: they read as walkable but can sit next to water
+    jobs = []
+    for cy in range(GRID_SIZE):
+        for cx in range(GRID_SIZE):
+            rect = (slice(cy * cells, (cy + 1) * cells + 2 * halo), slice(cx * cells, (cx + 1) * cells + 2 * halo))
+            clear_path = os.path.join(data_dir, f"{CLEARANCE_PREFIX}{cx}_{cy}.png")
+            reach_path = os.path.join(data_dir, f"{REACH_PREFIX}{cx}_{cy}.png") if walkable else None
+            jobs.append((full[rect], walk[rect] if walkable else None, halo, cell_size,
+                         clear_path, reach_path, compress_level))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(field_chunk, jobs, chunksize=8))
+
+class ClearanceMap:
+    """Queries over the baked clearance fields, using MapLoader's world -> cell mapping."""
+
+    def __init__(self, data_dir=None, cache_bytes=DEFAULT_CACHE_BYTES, config=None):
+        if config is None:
+            config = load_config() if os.path.exists(CONFIG_FILE) else {}
+        self.terrain = TerrainMap(data_dir, cache_bytes, config)
+        data_dir = self.terrain.data_dir
+        self.clear = TerrainMap(data_dir, cache_bytes, config, prefix=CLEARANCE_PREFIX)
+        self.reach = TerrainMap(data_dir, cache_bytes, config, prefix=REACH_PREFIX)
+        self.cell_size = self.terrain.cell_size
+
+        # Every cell offset within MAX_DISTANCE, nearest first, for nearest_walkable
+        r = halo_cells(self.cell_size)
+        oy, ox = np.mgrid[-r:r + 1, -r:r + 1]
+        d2 = (ox * ox + oy * oy).ravel()
+        keep = quantize(d2, self.cell_size) < MAX_DISTANCE
+        order = np.argsort(d2[keep], kind="stable")
+        self._offsets = np.stack([ox.ravel(), oy.ravel()], axis=1)[keep][order]
+        self._offset_px = quantize(d2[keep][order], self.cell_size)
+
+    def clearance_at(self, x, y):
+        """World px from (x, y)'s cell to the nearest impassable cell; 0 when impassable."""
+        return self.clear.get_terrain_at(x, y)
+
+    def clearance_batch(self, positions):
+        return self.clear.get_terrain_batch(positions)
+
+    def is_radius_clear(self, x, y, radius):
+        """True if no impassable cell centre lies within radius world px of (x, y)'s cell centre.
+
+        Positions outside the grid read as clearance 0, so only radius 0 passes
+        there. Radii above MAX_DISTANCE cannot be answered from the field.
+        """
+        if radius > MAX_DISTANCE:
+            raise ValueError(f"radius {radius} exceeds the baked MAX_DISTANCE ({MAX_DISTANCE})")
+        return self.clearance_at(x, y) >= radius
+
+    def is_radius_clear_batch(self, positions, radius):
+        radius = np.asarray(radius)
+        if np.any(radius > MAX_DISTANCE):
+            raise ValueError(f"radius exceeds the baked MAX_DISTANCE ({MAX_DISTANCE})")
+        return self.clearance_batch(positions) >= radius
+
+    def nearest_walkable(self, x, y):
+        """Centre of the walkable cell nearest to (x, y), or (x, y) itself if walkable.
+
+        Only cells inside the grid are candidates, so the result is always on the
+        map (an off-map (x, y) gets the nearest walkable map cell). The reach
+        field gives the exact distance band, so only the ring of cells in that
+        band is checked; without it the whole MAX_DISTANCE disc is scanned.
+        Returns None if nothing walkable lies within MAX_DISTANCE.
+        """
+        limit = CHUNK_SIZE * GRID_SIZE
+        on_map = 0 <= x < limit and 0 <= y < limit
+        if on_map and not is_impassable(self.terrain.get_terrain_at(x, y)):
+            return x, y
+
+        offsets = self._offsets
+        if on_map and self.reach.get_chunk(int(x // CHUNK_SIZE), int(y // CHUNK_SIZE)) is not None:
+            band = self.reach.get_terrain_at(x, y)
+            if band >= MAX_DISTANCE:
+                return None
+            offsets = offsets[self._offset_px == band]
+
+        size = self.cell_size
+        centres = (np.array([x // size, y // size]) + offsets + 0.5) * size
+        centres = centres[np.all((centres >= 0) & (centres < limit), axis=1)]
+        walkable = np.flatnonzero(~is_impassable(self.terrain.get_terrain_batch(centres)))
+        if len(walkable) == 0:
+            return None
+        # Offsets are sorted by distance, so the first hit is the nearest
+        cx, cy = centres[walkable[0]]
+        return float(cx), float(cy)
+
+def main():
+    config = load_config()
+    data_dir = config.get("output_dir", "map_data")
+
+    print(f"Baking clearance fields for {data_dir} (max {MAX_DISTANCE}px, walkable={WALKABLE_DISTANCE})...")
+    t0 = time.perf_counter()
+    near = bake_clearance(data_dir)
+    if near is None:
+        print("No baked chunks found. Run terrain_baker.py first.")
+        return
+    print(f"  {near} walkable cells within {MAX_DISTANCE}px of water")
+    print(f"Saved {CLEARANCE_PREFIX}X_Y.png fields in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
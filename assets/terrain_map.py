@@ -0,0 +1,284 @@
+import os
+import json
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# Config
+CONFIG_FILE = "terrain_config.json"
+
+# Mirrors scripts/MapLoader.gd
+CHUNK_SIZE = 1024
+GRID_SIZE = 16 # 16 * 1024 = 16384 pixels
+
+# Water/Void range as checked by MapManager.gd and TerrainSynchronizer.gd (ID 150)
+IMPASSABLE_MIN = 140
+IMPASSABLE_MAX = 160
+
+# Default chunk cache budget (a 256x256 L8 chunk is 64 KB, so this holds the whole 16x16 map)
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Batches are processed in blocks so temporaries stay bounded on huge queries
+BATCH_BLOCK = 1 << 20
+
+def load_config():
+    with open(CONFIG_FILE, 'r') as f:
+        return json.load(f)
+
+def is_impassable(terrain_ids):
+    """Vectorized Water/Void check, same range as MapManager.get_path_world."""
+    ids = np.asarray(terrain_ids)
+    return (ids >= IMPASSABLE_MIN) & (ids <= IMPASSABLE_MAX)
+
+class TerrainMap:
+    """Read-only view over the baked data_X_Y.png chunks.
+
+    Every query reproduces MapLoader.get_terrain_at: negative positions and
+    missing chunks read as 0 (walkable), world pixels are scaled by the
+    data/visual ratio, truncated and clamped to the chunk image.
+    Chunks are decoded lazily and kept in an LRU cache capped at cache_bytes.
+    prefix selects another per-chunk L8 layer baked on the same grid
+    (e.g. "clear_" for the clearance field from terrain_clearance.py).
+    """
+
+    def __init__(self, data_dir=None, cache_bytes=DEFAULT_CACHE_BYTES, config=None, prefix="data_"):
+        if config is None:
+            config = load_config() if os.path.exists(CONFIG_FILE) else {}
+        self.data_dir = data_dir or config.get("output_dir", "map_data")
+        self.cache_bytes = cache_bytes
+        self.prefix = prefix
+        # World size of one data cell, used to step along segments
+        self.cell_size = CHUNK_SIZE / config.get("target_size", 256)
+
+        self._cache = OrderedDict() # (cx, cy) -> np.ndarray (uint8) or None
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # --- Chunk Cache ---
+
+    def chunk_path(self, cx, cy):
+        return os.path.join(self.data_dir, f"{self.prefix}{cx}_{cy}.png")
+
+    def get_chunk(self, cx, cy):
+        """Returns the chunk as a 2D uint8 array, or None if it was never baked."""
+        key = (cx, cy)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+
+        self.misses += 1
+        data = None
+        path = self.chunk_path(cx, cy)
+        if cx >= 0 and cy >= 0 and os.path.exists(path):
+            with Image.open(path) as img:
+                data = np.asarray(img.convert("L"), dtype=np.uint8)
+
+        self._cache[key] = data
+        if data is not None:
+            self._cached_bytes += data.nbytes
+        self._evict()
+        return data
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, data = self._cache.popitem(last=False)
+            if data is not None:
+                self._cached_bytes -= data.nbytes
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._cached_bytes = 0
+
+    @property
+    def cached_bytes(self):
+        return self._cached_bytes
+
+    # --- Point Queries ---
+
+    def get_terrain_at(self, x, y):
+        """Single lookup, identical to MapLoader.get_terrain_at(Vector2(x, y))."""
+        if x < 0 or y < 0:
+            return 0
+        if x >= CHUNK_SIZE * GRID_SIZE or y >= CHUNK_SIZE * GRID_SIZE:
+            return 0 # Never loaded by MapLoader
+
+        cx = int(x // CHUNK_SIZE)
+        cy = int(y // CHUNK_SIZE)
+        data = self.get_chunk(cx, cy)
+        if data is None:
+            return 0
+
+        h, w = data.shape
+        ratio = w / float(CHUNK_SIZE)
+        px = int((x - cx * CHUNK_SIZE) * ratio)
+        py = int((y - cy * CHUNK_SIZE) * ratio)
+
+        # Clamp to be safe
+        px = min(max(px, 0), w - 1)
+        py = min(max(py, 0), h - 1)
+        return int(data[py, px])
+
+    def get_terrain_batch(self, positions):
+        """Looks up an (N, 2) array of world positions, returns (N,) uint8 IDs."""
+        pos = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        out = np.zeros(len(pos), dtype=np.uint8)
+        for start in range(0, len(pos), BATCH_BLOCK):
+            block = pos[start:start + BATCH_BLOCK]
+            out[start:start + len(block)] = self._lookup_block(block[:, 0], block[:, 1])
+        return out
+
+    def _lookup_block(self, xs, ys):
+        out = np.zeros(len(xs), dtype=np.uint8)
+
+        # MapLoader only ever loads chunks inside the grid, everything else reads as 0
+        limit = CHUNK_SIZE * GRID_SIZE
+        valid = (xs >= 0) & (ys >= 0) & (xs < limit) & (ys < limit)
+        idx = np.flatnonzero(valid)
+        if len(idx) == 0:
+            return out
+
+        xs = xs[idx]
+        ys = ys[idx]
+        cxs = (xs // CHUNK_SIZE).astype(np.int64)
+        cys = (ys // CHUNK_SIZE).astype(np.int64)
+        keys = cys * GRID_SIZE + cxs
+
+        # Fetch each touched chunk once and gather them into one stack so the
+        # whole block resolves with a single fancy-index instead of per-chunk masks
+        touched = np.flatnonzero(np.bincount(keys, minlength=GRID_SIZE * GRID_SIZE))
+        chunks = [self.get_chunk(int(k % GRID_SIZE), int(k // GRID_SIZE)) for k in touched]
+        shapes = {c.shape for c in chunks if c is not None}
+        if not shapes:
+            return out
+        if len(shapes) > 1:
+            return self._lookup_block_mixed(out, idx, xs, ys, cxs, cys, keys, touched, chunks)
+
+        h, w = shapes.pop()
+        stack = np.zeros((len(chunks) + 1, h, w), dtype=np.uint8) # Slot 0 = missing chunk
+        slot_of_key = np.zeros(GRID_SIZE * GRID_SIZE, dtype=np.int64)
+        for i, (k, c) in enumerate(zip(touched, chunks)):
+            if c is not None:
+                stack[i + 1] = c
+                slot_of_key[k] = i + 1
+
+        ratio = w / float(CHUNK_SIZE)
+        # int() truncation in GDScript == floor here since local coords are >= 0
+        px = ((xs - cxs * CHUNK_SIZE) * ratio).astype(np.int64)
+        py = ((ys - cys * CHUNK_SIZE) * ratio).astype(np.int64)
+        np.clip(px, 0, w - 1, out=px)
+        np.clip(py, 0, h - 1, out=py)
+        out[idx] = stack[slot_of_key[keys], py, px]
+        return out
+
+    def _lookup_block_mixed(self, out, idx, xs, ys, cxs, cys, keys, touched, chunks):
+        # Chunks baked at different resolutions, fall back to one pass per chunk
+        for k, data in zip(touched, chunks):
+            if data is None:
+                continue
+            sel = np.flatnonzero(keys == k)
+            h, w = data.shape
+            ratio = w / float(CHUNK_SIZE)
+            px = ((xs[sel] - cxs[sel] * CHUNK_SIZE) * ratio).astype(np.int64)
+            py = ((ys[sel] - cys[sel] * CHUNK_SIZE) * ratio).astype(np.int64)
+            np.clip(px, 0, w - 1, out=px)
+            np.clip(py, 0, h - 1, out=py)
+            out[idx[sel]] = data[py, px]
+        return out
+
+    def is_impassable_batch(self, positions):
+        return is_impassable(self.get_terrain_batch(positions))
+
+    # --- Segment Traversal ---
+
+    def segment_cells(self, start, end):
+        """Sample points for every data cell the segment start->end passes through.
+
+        Cell boundary crossings are computed analytically (grid DDA) so corner
+        clips are never skipped, unlike fixed-step sampling. Returns (ts, points)
+        where ts is the parametric entry of each cell along the segment.
+        """
+        x0, y0 = float(start[0]), float(start[1])
+        x1, y1 = float(end[0]), float(end[1])
+        dx = x1 - x0
+        dy = y1 - y0
+        size = self.cell_size
+
+        crossings = [np.zeros(1), np.ones(1)]
+        for p0, d in ((x0, dx), (y0, dy)):
+            if d == 0:
+                continue
+            lo, hi = sorted((p0, p0 + d))
+            lines = np.arange(np.floor(lo / size) + 1, np.ceil(hi / size)) * size
+            crossings.append((lines - p0) / d)
+
+        ts = np.unique(np.concatenate(crossings))
+        ts = ts[(ts >= 0.0) & (ts <= 1.0)]
+        if len(ts) < 2:
+            ts = np.array([0.0, 1.0])
+
+        # Sample each traversed cell at the midpoint of its segment span
+        mids = (ts[:-1] + ts[1:]) * 0.5
+        points = np.empty((len(mids) + 1, 2))
+        points[:-1, 0] = x0 + dx * mids
+        points[:-1, 1] = y0 + dy * mids
+        # The end point itself is what MapManager checks, so always include it
+        points[-1] = (x1, y1)
+        return np.append(ts[:-1], 1.0), points
+
+    def raycast(self, start, end):
+        """Returns (hit_pos, terrain_id) of the first impassable cell from start to end, or None."""
+        ts, points = self.segment_cells(start, end)
+        ids = self.get_terrain_batch(points)
+        blocked = np.flatnonzero(is_impassable(ids))
+        if len(blocked) == 0:
+            return None
+
+        i = int(blocked[0])
+        # Report where the segment enters the blocking cell
+        t = ts[i]
+        hit = (float(start[0] + (end[0] - start[0]) * t), float(start[1] + (end[1] - start[1]) * t))
+        return hit, int(ids[i])
+
+    def is_segment_clear(self, start, end):
+        return self.raycast(start, end) is None
+
+    def raycast_batch(self, starts, ends):
+        """Raycasts many segments, returns (N,) bool blocked and (N, 2) hit positions (NaN when clear)."""
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        blocked = np.zeros(len(starts), dtype=bool)
+        hits = np.full((len(starts), 2), np.nan)
+        for i in range(len(starts)):
+            result = self.raycast(starts[i], ends[i])
+            if result is not None:
+                blocked[i] = True
+                hits[i] = result[0]
+        return blocked, hits
+
+def main():
+    terrain = TerrainMap()
+    world = CHUNK_SIZE * GRID_SIZE
+    count = 4_000_000
+
+    print(f"Benchmarking {count} random lookups over {terrain.data_dir}...")
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, world, size=(count, 2))
+
+    # Warm the cache so the timing reflects lookup cost, not PNG decode
+    terrain.get_terrain_batch(positions[:100_000])
+
+    t0 = time.perf_counter()
+    ids = terrain.get_terrain_batch(positions)
+    elapsed = time.perf_counter() - t0
+
+    print(f"  {count / elapsed / 1e6:.1f}M queries/s ({elapsed:.2f}s)")
+    print(f"  Impassable: {np.count_nonzero(is_impassable(ids)) / count:.1%}")
+    print(f"  Cache: {terrain.cached_bytes // 1024} KB, {terrain.hits} hits / {terrain.misses} misses")
+
+if __name__ == "__main__":
+    main()
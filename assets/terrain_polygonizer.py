@@ -0,0 +1,527 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from terrain_map import TerrainMap, CHUNK_SIZE, GRID_SIZE, is_impassable, load_config
+
+# Config
+OUTPUT_FILE = "terrain_outlines.json"
+
+# Douglas-Peucker tolerance in world pixels (one data cell = 4px at target_size 256).
+# Simplification is topology checked: no outline crosses itself or another outline,
+# and outlines only touch where the exact mask boundaries touch (diagonal saddles).
+# Simplification steps that would break this are undone (worst case: the exact outline).
+SIMPLIFY_TOLERANCE = 6.0
+
+# Obstacles smaller than this (world px^2) are dropped; 0 keeps every water speck
+MIN_POLYGON_AREA = 0.0
+
+# Worker processes for the per-chunk trace (None = one per CPU)
+WORKERS = None
+
+# Grid bucket (cells) used to find outline segments that may intersect
+PAIR_BUCKET = 8
+
+# Directed boundary segments keep the impassable side on their right (screen space, y down)
+# so every outer boundary comes out in one winding and every hole in the other.
+
+def _runs(mask):
+    """Returns (row, start, end) for every horizontal run of True in a 2D bool array (end exclusive)."""
+    h, w = mask.shape
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    d = np.diff(padded, axis=1)
+    rows_s, starts = np.nonzero(d == 1)
+    _, ends = np.nonzero(d == -1)
+    return rows_s, starts, ends
+
+def trace_chunk(args):
+    """Extracts boundary segments of one chunk.
+
+    args is (cx, cy, halo) where halo is the chunk's impassable mask padded by one
+    cell taken from the neighbouring chunks, so seam edges are only emitted where
+    the other side really is walkable. Segments are (sx, sy, ex, ey) in global
+    cell-lattice coordinates and end exactly on the seams, ready for stitching.
+    """
+    cx, cy, halo = args
+    core = halo[1:-1, 1:-1]
+    h, w = core.shape
+    ox, oy = cx * w, cy * h
+
+    top = core & ~halo[:-2, 1:-1]
+    bottom = core & ~halo[2:, 1:-1]
+    left = core & ~halo[1:-1, :-2]
+    right = core & ~halo[1:-1, 2:]
+
+    segs = []
+
+    # Top edges run +x along the top of the row
+    y, s, e = _runs(top)
+    segs.append(np.stack([ox + s, oy + y, ox + e, oy + y], axis=1))
+
+    # Bottom edges run -x along the bottom of the row
+    y, s, e = _runs(bottom)
+    segs.append(np.stack([ox + e, oy + y + 1, ox + s, oy + y + 1], axis=1))
+
+    # Left edges run -y, right edges run +y (runs taken on the transposed mask)
+    x, s, e = _runs(left.T)
+    segs.append(np.stack([ox + x, oy + e, ox + x, oy + s], axis=1))
+
+    x, s, e = _runs(right.T)
+    segs.append(np.stack([ox + x + 1, oy + s, ox + x + 1, oy + e], axis=1))
+
+    return np.concatenate(segs).astype(np.int32)
+
+def stitch_segments(segs):
+    """Links directed segments from all chunks into closed loops of corner vertices.
+
+    Collinear segments meeting at a seam are merged. Where two loops touch
+    diagonally (saddle vertex) the walk always turns right, keeping impassable
+    cells 4-connected like the baker's diagonal-gap fix assumes.
+    """
+    starts = {}
+    for i, (sx, sy, ex, ey) in enumerate(segs.tolist()):
+        starts.setdefault((sx, sy), []).append(i)
+
+    seg_list = segs.tolist()
+    used = bytearray(len(seg_list))
+    loops = []
+
+    for first in range(len(seg_list)):
+        if used[first]:
+            continue
+
+        loop = []
+        i = first
+        while not used[i]:
+            used[i] = 1
+            sx, sy, ex, ey = seg_list[i]
+            dx = (ex > sx) - (ex < sx)
+            dy = (ey > sy) - (ey < sy)
+
+            # Only record a vertex where the direction changes
+            if not loop or loop[-1][2:] != (dx, dy):
+                loop.append((sx, sy, dx, dy))
+
+            candidates = [c for c in starts.get((ex, ey), ()) if not used[c]]
+            if not candidates:
+                break
+            if len(candidates) > 1:
+                turn = (-dy, dx)
+                for c in candidates:
+                    csx, csy, cex, cey = seg_list[c]
+                    if ((cex > csx) - (cex < csx), (cey > csy) - (cey < csy)) == turn:
+                        i = c
+                        break
+                else:
+                    i = candidates[0]
+            else:
+                i = candidates[0]
+
+        # Closing segment may continue the first one's direction
+        if len(loop) > 1 and loop[0][2:] == loop[-1][2:]:
+            loop.pop(0)
+        loops.append(np.array([(v[0], v[1]) for v in loop], dtype=np.int64))
+
+    return loops
+
+def signed_area(poly):
+    """Shoelace area, positive for loops with the impassable side inside (outer boundaries)."""
+    x = poly[:, 0].astype(np.float64)
+    y = poly[:, 1].astype(np.float64)
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def is_clockwise(poly):
+    # Same test as Godot's Geometry2D.is_polygon_clockwise
+    x = poly[:, 0].astype(np.float64)
+    y = poly[:, 1].astype(np.float64)
+    return float(np.sum((np.roll(x, -1) - x) * (np.roll(y, -1) + y))) > 0.0
+
+def _farthest(points, a, b):
+    # Index and distance of the point in points[a + 1:b] farthest from the chord a-b
+    p0 = points[a]
+    seg = points[b] - p0
+    rel = points[a + 1:b] - p0
+    length = np.hypot(seg[0], seg[1])
+    if length == 0:
+        dist = np.hypot(rel[:, 0], rel[:, 1])
+    else:
+        dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+    k = int(np.argmax(dist))
+    return a + 1 + k, dist[k]
+
+def _simplify_open(points, tolerance):
+    # Iterative Douglas-Peucker, endpoints always kept; returns the keep mask
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        m, dist = _farthest(points, a, b)
+        if dist > tolerance:
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return keep
+
+def _loop_keep(loop, tolerance):
+    """Douglas-Peucker keep mask over a closed loop, split at the vertex farthest from the first."""
+    if tolerance <= 0 or len(loop) <= 4:
+        return np.ones(len(loop), dtype=bool)
+    keep = np.zeros(len(loop), dtype=bool)
+    pts = loop.astype(np.float64)
+    d = np.hypot(pts[:, 0] - pts[0, 0], pts[:, 1] - pts[0, 1])
+    far = int(np.argmax(d))
+    keep[:far + 1] = _simplify_open(pts[:far + 1], tolerance)
+    keep[far:] |= _simplify_open(np.vstack([pts[far:], pts[:1]]), tolerance)[:-1]
+    if np.count_nonzero(keep) < 3:
+        keep[:] = True # Collapsed, keep the exact outline
+    return keep
+
+def simplify_loop(loop, tolerance):
+    """Douglas-Peucker over a closed loop, without any topology check."""
+    return loop[_loop_keep(loop, tolerance)]
+
+def _candidate_pairs(p, q, bucket=PAIR_BUCKET):
+    """(i, j) index pairs (i < j) of segments p->q whose bounding boxes share a grid bucket."""
+    lo = np.minimum(p, q)
+    hi = np.maximum(p, q)
+    blo = lo // bucket
+    span = hi // bucket - blo + 1
+    counts = span[:, 0] * span[:, 1]
+    seg = np.repeat(np.arange(len(p)), counts)
+    local = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    bx = blo[seg, 0] + local % span[seg, 0]
+    by = blo[seg, 1] + local // span[seg, 0]
+    keys = by * (int(bx.max()) + 1) + bx
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    seg = seg[order]
+
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    pairs = []
+    for s, e in zip(np.r_[0, bounds].tolist(), np.r_[bounds, len(keys)].tolist()):
+        if e - s < 2:
+            continue
+        i, j = np.triu_indices(e - s, 1)
+        pairs.append(np.stack([seg[s + i], seg[s + j]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    pairs = np.unique(pairs[:, 0] * len(p) + pairs[:, 1])
+    a, b = pairs // len(p), pairs % len(p)
+    overlap = np.all((lo[a] <= hi[b]) & (lo[b] <= hi[a]), axis=1)
+    return np.stack([a[overlap], b[overlap]], axis=1)
+
+def _orient(o, u, v):
+    return (u[:, 0] - o[:, 0]) * (v[:, 1] - o[:, 1]) - (u[:, 1] - o[:, 1]) * (v[:, 0] - o[:, 0])
+
+def _on_segment(a, b, c):
+    # c is already known to be collinear with a-b
+    return np.all((np.minimum(a, b) <= c) & (c <= np.maximum(a, b)), axis=1)
+
+def _vertex_keys(points):
+    return points[:, 0] * 65536 + points[:, 1]
+
+def _topology_errors(rings, contacts):
+    """Global indices of segments that cross, overlap or touch anywhere but an exact contact vertex.
+
+    rings are integer lattice loops, segment i runs from vertex i to the next
+    vertex of its ring (rings concatenated in order). contacts holds the
+    _vertex_keys where the exact loops legitimately meet (diagonal saddles).
+    """
+    lens = np.array([len(r) for r in rings])
+    first = np.cumsum(lens) - lens
+    p = np.concatenate(rings)
+    q = np.concatenate([np.roll(r, -1, axis=0) for r in rings])
+    prev = np.concatenate([np.roll(r, 1, axis=0) for r in rings])
+    ring = np.repeat(np.arange(len(rings)), lens)
+    idx = np.arange(len(p)) - first[ring]
+    prev_seg = first[ring] + (idx - 1) % lens[ring]
+    errors = set()
+
+    # Spikes: a vertex whose next edge doubles back over the previous one
+    d_in = p - prev
+    d_out = q - p
+    spike = np.flatnonzero((_orient(prev, p, q) == 0) & (np.sum(d_in * d_out, axis=1) < 0))
+    errors.update(spike.tolist())
+    errors.update(prev_seg[spike].tolist())
+
+    pairs = _candidate_pairs(p, q)
+    a, b = pairs[:, 0], pairs[:, 1]
+    gap = np.abs(idx[a] - idx[b])
+    adjacent = (ring[a] == ring[b]) & ((gap == 1) | (gap == lens[ring[a]] - 1))
+    a, b = a[~adjacent], b[~adjacent]
+
+    p1, p2, q1, q2 = p[a], q[a], p[b], q[b]
+    d1, d2 = _orient(q1, q2, p1), _orient(q1, q2, p2)
+    d3, d4 = _orient(p1, p2, q1), _orient(p1, p2, q2)
+    proper = (np.sign(d1) * np.sign(d2) < 0) & (np.sign(d3) * np.sign(d4) < 0)
+
+    # Collinear pairs sharing more than a point
+    collinear = (d1 == 0) & (d2 == 0)
+    axis = (p1[:, 0] == p2[:, 0]).astype(np.int64)
+    rows = np.arange(len(a))
+    lo_a = np.minimum(p1[rows, axis], p2[rows, axis])
+    hi_a = np.maximum(p1[rows, axis], p2[rows, axis])
+    lo_b = np.minimum(q1[rows, axis], q2[rows, axis])
+    hi_b = np.maximum(q1[rows, axis], q2[rows, axis])
+    overlap = collinear & (np.minimum(hi_a, hi_b) > np.maximum(lo_a, lo_b))
+
+    # Touches are only fine at an endpoint shared by both segments that the exact loops share too
+    t_p1 = (d1 == 0) & _on_segment(q1, q2, p1)
+    t_p2 = (d2 == 0) & _on_segment(q1, q2, p2)
+    t_q1 = (d3 == 0) & _on_segment(p1, p2, q1)
+    t_q2 = (d4 == 0) & _on_segment(p1, p2, q2)
+    s_p1 = np.all(p1 == q1, axis=1) | np.all(p1 == q2, axis=1)
+    s_p2 = np.all(p2 == q1, axis=1) | np.all(p2 == q2, axis=1)
+    s_q1 = np.all(q1 == p1, axis=1) | np.all(q1 == p2, axis=1)
+    s_q2 = np.all(q2 == p1, axis=1) | np.all(q2 == p2, axis=1)
+    k_p1 = np.isin(_vertex_keys(p1), contacts)
+    k_p2 = np.isin(_vertex_keys(p2), contacts)
+    stray = (t_p1 & ~(s_p1 & k_p1)) | (t_p2 & ~(s_p2 & k_p2)) | (t_q1 & ~s_q1) | (t_q2 & ~s_q2)
+
+    hit = proper | overlap | stray
+    errors.update(a[hit].tolist())
+    errors.update(b[hit].tolist())
+
+    # At a contact vertex the rings may touch but not pass through each other
+    keys = _vertex_keys(p)
+    at = np.flatnonzero(np.isin(keys, contacts))
+    a_in = np.arctan2(d_in[at, 1], d_in[at, 0]) + np.pi # Direction back towards prev
+    a_out = np.arctan2(d_out[at, 1], d_out[at, 0])
+    visits = {}
+    for k, g, u, v in zip(keys[at].tolist(), at.tolist(), a_in.tolist(), a_out.tolist()):
+        visits.setdefault(k, []).append((g, u, v))
+    two_pi = 2 * np.pi
+    for group in visits.values():
+        for i in range(len(group)):
+            g, u, v = group[i]
+            arc = (v - u) % two_pi
+            for g2, u2, v2 in group[i + 1:]:
+                in_u = 0 < (u2 - u) % two_pi < arc
+                in_v = 0 < (v2 - u) % two_pi < arc
+                if in_u != in_v:
+                    errors.update((g, int(prev_seg[g]), g2, int(prev_seg[g2])))
+    return errors
+
+def simplify_rings(loops, tolerance):
+    """Simplifies every loop while keeping the exact loops' topology.
+
+    Plain Douglas-Peucker runs first; then every segment that crosses,
+    overlaps or newly touches another (or its own ring) has the simplification
+    step that produced it undone, by restoring the dropped vertex farthest from
+    it. This repeats until no errors remain, which at worst is the exact loop.
+    """
+    exact = [l.astype(np.int64) for l in loops]
+    if tolerance <= 0 or not exact:
+        return exact
+
+    keys, counts = np.unique(np.concatenate([_vertex_keys(l) for l in exact]), return_counts=True)
+    contacts = keys[counts > 1]
+
+    keeps = []
+    for l in exact:
+        keep = _loop_keep(l, tolerance)
+        # A loop that collapses or flips winding always falls back
+        if np.sign(signed_area(l[keep])) != np.sign(signed_area(l)):
+            keep[:] = True
+        keeps.append(keep)
+
+    while True:
+        rings = [l[k] for l, k in zip(exact, keeps)]
+        errors = _topology_errors(rings, contacts)
+        lens = np.array([len(r) for r in rings])
+        first = np.cumsum(lens) - lens
+        restored = False
+        for g in errors:
+            r = int(np.searchsorted(first, g, side="right")) - 1
+            kept = np.flatnonzero(keeps[r])
+            k = g - first[r]
+            s, e = kept[k], kept[(k + 1) % len(kept)]
+            n = len(exact[r])
+            span = (e - s) % n
+            if span < 2:
+                continue # Already an exact edge, the other segment of the pair gets refined
+            order = (s + np.arange(span + 1)) % n
+            m, _ = _farthest(exact[r][order].astype(np.float64), 0, span)
+            keeps[r][order[m]] = True
+            restored = True
+        if not restored:
+            return rings
+
+def _points_in_polygon(px, py, poly):
+    # Even-odd ray cast, vectorized over the polygon's edges
+    x0 = poly[:, 0].astype(np.float64)
+    y0 = poly[:, 1].astype(np.float64)
+    x1 = np.roll(x0, -1)
+    y1 = np.roll(y0, -1)
+    crosses = (y0 > py) != (y1 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xi = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    return int(np.count_nonzero(crosses & (px < xi))) % 2 == 1
+
+def _interior_probe(hole):
+    """A point just inside the impassable side of a hole loop's first edge.
+
+    The probe sits in the middle of a solid cell, so it is strictly inside the
+    enclosing outer loop even where both loops touch at a saddle.
+    """
+    (sx, sy), (ex, ey) = hole[0].tolist(), hole[1].tolist()
+    dx = (ex > sx) - (ex < sx)
+    dy = (ey > sy) - (ey < sy)
+    # Impassable side is to the right of the direction of travel
+    return sx + dx * 0.5 - dy * 0.5, sy + dy * 0.5 + dx * 0.5
+
+def build_polygons(loops, cell_size, tolerance, min_area):
+    """Splits loops into outers and holes, nests holes, simplifies and converts to world pixels."""
+    outers = []
+    holes = []
+    for loop in loops:
+        if len(loop) < 3:
+            continue
+        area = signed_area(loop)
+        (outers if area > 0 else holes).append((abs(area), loop))
+
+    # Smallest containing outer wins, so holes land in islands-in-lakes correctly
+    outers.sort(key=lambda item: item[0])
+    bboxes = np.array([[l[:, 0].min(), l[:, 1].min(), l[:, 0].max(), l[:, 1].max()] for _, l in outers]).reshape(-1, 4)
+    hole_lists = [[] for _ in outers]
+
+    for _, hole in holes:
+        px, py = _interior_probe(hole)
+        inside_bbox = np.flatnonzero(
+            (bboxes[:, 0] <= px) & (bboxes[:, 2] >= px) & (bboxes[:, 1] <= py) & (bboxes[:, 3] >= py)
+        )
+        for k in inside_bbox:
+            if _points_in_polygon(px, py, outers[k][1]):
+                hole_lists[k].append(hole)
+                break
+
+    min_cells = min_area / (cell_size * cell_size)
+    kept = []
+    for (area, outer), outer_holes in zip(outers, hole_lists):
+        if area < min_cells:
+            continue
+        kept.append([outer] + [h for h in outer_holes if abs(signed_area(h)) >= min_cells])
+
+    # All kept rings are simplified together so they can be checked against each other
+    flat = simplify_rings([ring for group in kept for ring in group], tolerance / cell_size)
+    polygons = []
+    i = 0
+    for group in kept:
+        rings = flat[i:i + len(group)]
+        i += len(group)
+        polygons.append({
+            "outline": _to_outline(rings[0], cell_size),
+            "holes": [_to_outline(h, cell_size) for h in rings[1:]],
+        })
+
+    # Largest first, same ordering NavigationCarver uses for its solids
+    polygons.reverse()
+    return polygons
+
+def _to_outline(loop, cell_size):
+    # Godot NavigationPolygon outlines: all clockwise, flat [x0, y0, x1, y1, ...]
+    if not is_clockwise(loop):
+        loop = loop[::-1]
+    world = loop * cell_size
+    if np.all(world == np.round(world)):
+        return [int(v) for v in world.ravel()]
+    return [round(float(v), 2) for v in world.ravel()]
+
+def load_impassable_masks(terrain):
+    """Returns {(cx, cy): bool mask} for every baked chunk."""
+    masks = {}
+    for cx in range(GRID_SIZE):
+        for cy in range(GRID_SIZE):
+            data = terrain.get_chunk(cx, cy)
+            if data is not None:
+                masks[(cx, cy)] = is_impassable(data)
+    return masks
+
+def _halo(masks, cx, cy):
+    # Pad a chunk with one cell from each neighbour; outside the map counts as walkable
+    core = masks[(cx, cy)]
+    h, w = core.shape
+    halo = np.zeros((h + 2, w + 2), dtype=bool)
+    halo[1:-1, 1:-1] = core
+
+    def edge(nx, ny):
+        m = masks.get((nx, ny))
+        return m if m is not None and m.shape == core.shape else None
+
+    if (m := edge(cx, cy - 1)) is not None: halo[0, 1:-1] = m[-1, :]
+    if (m := edge(cx, cy + 1)) is not None: halo[-1, 1:-1] = m[0, :]
+    if (m := edge(cx - 1, cy)) is not None: halo[1:-1, 0] = m[:, -1]
+    if (m := edge(cx + 1, cy)) is not None: halo[1:-1, -1] = m[:, 0]
+    return halo
+
+def polygonize(terrain=None, tolerance=SIMPLIFY_TOLERANCE, min_area=MIN_POLYGON_AREA, workers=WORKERS):
+    terrain = terrain or TerrainMap()
+    masks = load_impassable_masks(terrain)
+    if not masks:
+        return None
+
+    shapes = {m.shape for m in masks.values()}
+    if len(shapes) > 1:
+        raise ValueError(f"Chunks baked at mixed resolutions: {sorted(shapes)}")
+    h, w = shapes.pop()
+    cell_size = CHUNK_SIZE / w
+
+    jobs = [(cx, cy, _halo(masks, cx, cy)) for (cx, cy) in masks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk_segs = list(pool.map(trace_chunk, jobs, chunksize=8))
+
+    segs = np.concatenate(chunk_segs)
+    loops = stitch_segments(segs)
+    polygons = build_polygons(loops, cell_size, tolerance, min_area)
+
+    # Per-chunk index so the game can fetch only the outlines touching loaded chunks
+    chunk_index = {}
+    for i, poly in enumerate(polygons):
+        pts = np.array(poly["outline"]).reshape(-1, 2)
+        x0, y0 = (pts.min(axis=0) // CHUNK_SIZE).astype(int)
+        x1, y1 = (np.minimum(pts.max(axis=0), CHUNK_SIZE * GRID_SIZE - 1) // CHUNK_SIZE).astype(int)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                chunk_index.setdefault(f"{cx}_{cy}", []).append(i)
+
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "cell_size": cell_size,
+        "tolerance": tolerance,
+        "segments": int(len(segs)),
+        "polygons": polygons,
+        "chunks": chunk_index,
+    }
+
+def main():
+    config = load_config()
+    terrain = TerrainMap(config=config)
+    out_path = os.path.join(terrain.data_dir, OUTPUT_FILE)
+
+    print(f"Polygonizing impassable terrain from {terrain.data_dir} (tolerance {SIMPLIFY_TOLERANCE}px)...")
+    t0 = time.perf_counter()
+    result = polygonize(terrain)
+    if result is None:
+        print("No baked chunks found. Run terrain_baker.py first.")
+        return
+
+    with open(out_path, 'w') as f:
+        json.dump(result, f, separators=(",", ":"))
+
+    polygons = result["polygons"]
+    vertices = sum(len(p["outline"]) // 2 + sum(len(h) // 2 for h in p["holes"]) for p in polygons)
+    holes = sum(len(p["holes"]) for p in polygons)
+    print(f"  {result['segments']} boundary segments -> {len(polygons)} polygons, {holes} holes, {vertices} vertices")
+    print(f"Saved {out_path} ({os.path.getsize(out_path) // 1024} KB) in {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
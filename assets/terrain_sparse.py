@@ -0,0 +1,443 @@
+import os
+import time
+import zlib
+import struct
+
+import numpy as np
+from PIL import Image
+
+from terrain_map import CHUNK_SIZE, GRID_SIZE, load_config
+
+# Sparse alternative to the map_data/data_X_Y.png chunks: one pack file where
+# every chunk is either a single-value marker, a quadtree or a row-major
+# run-length list, whichever is smallest. The decoded structures are what stay
+# resident, so a mostly-grass or mostly-ocean chunk costs a few bytes instead of
+# a full 256x256 L8 image.
+#
+# Layout (little endian):
+#   header  "MRTS", version u8, grid u16, chunk cells u16, RLE row offset width u8 (2 or 4)
+#   index   grid*grid entries of (kind u8, value u8, offset u32, length u32), row-major by cy
+#   payload zlib-deflated per chunk, inflating to
+#     QUADTREE  node count u32, internal-node bitmap (level order, LSB first), leaf values u8
+#     RLE       run count u32, first run of each row u16/u32[cells], run x starts u8[runs], values u8[runs]
+#               (runs never cross a row, so a start fits in a byte for 256-cell chunks; row
+#               offsets are u16 unless a chunk could hold more runs than that, e.g. 512 cells)
+
+OUTPUT_FILE = "terrain_sparse.bin"
+
+MAGIC = b"MRTS"
+VERSION = 2
+HEADER = struct.Struct("<4sBHHB")
+INDEX_ENTRY = struct.Struct("<BBII")
+
+KIND_MISSING = 0  # Never baked: reads as 0 like MapLoader
+KIND_UNIFORM = 1
+KIND_QUADTREE = 2
+KIND_RLE = 3
+
+# Popcount of every byte, for rank queries on the quadtree bitmap
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# --- Encoding ---
+
+def encode_quadtree(data):
+    """Level-order quadtree of a square power-of-two uint8 array -> (node count, bitmap bytes, leaf bytes).
+
+    A node is internal when its block is not one value; its four children
+    (TL, TR, BL, BR) are stored contiguously, so child k of the r-th internal
+    node is node 1 + 4 * r + k and no pointers have to be written.
+    """
+    size = data.shape[0]
+    depth = size.bit_length() - 1
+
+    # Pyramid of (uniform, value) per level, finest first
+    uniform = [np.ones(data.shape, dtype=bool)]
+    values = [data]
+    for _ in range(depth):
+        u, v = uniform[-1], values[-1]
+        tl, tr, bl, br = v[0::2, 0::2], v[0::2, 1::2], v[1::2, 0::2], v[1::2, 1::2]
+        same = u[0::2, 0::2] & u[0::2, 1::2] & u[1::2, 0::2] & u[1::2, 1::2]
+        same &= (tl == tr) & (tl == bl) & (tl == br)
+        uniform.append(same)
+        values.append(tl)
+    uniform.reverse()
+    values.reverse()
+
+    flags = []
+    leaves = []
+    ys = np.zeros(1, dtype=np.int64)
+    xs = np.zeros(1, dtype=np.int64)
+    for level in range(depth + 1):
+        internal = ~uniform[level][ys, xs]
+        flags.append(internal)
+        leaves.append(values[level][ys[~internal], xs[~internal]])
+        if not internal.any():
+            break
+        # Children of internal nodes in (TL, TR, BL, BR) order, parents kept in order
+        py, px = ys[internal], xs[internal]
+        ys = (2 * py[:, None] + np.array([0, 0, 1, 1])).ravel()
+        xs = (2 * px[:, None] + np.array([0, 1, 0, 1])).ravel()
+
+    flags = np.concatenate(flags)
+    bitmap = np.packbits(flags, bitorder="little")
+    return len(flags), bitmap.tobytes(), np.concatenate(leaves).astype(np.uint8).tobytes()
+
+def rle_offset_type(cells):
+    """Row offset dtype for cells x cells chunks: u16 while the last row's first run index fits."""
+    return np.dtype("<u2") if (cells - 1) * cells <= 0xFFFF else np.dtype("<u4")
+
+def encode_rle(data):
+    """Per-row runs -> (row offsets, x starts, values). Uses u8 starts when rows fit in a byte."""
+    h, w = data.shape
+    change = np.ones(data.shape, dtype=bool)
+    change[:, 1:] = data[:, 1:] != data[:, :-1]
+    rows, starts = np.nonzero(change)
+    row_offsets = np.searchsorted(rows, np.arange(h)).astype(rle_offset_type(h))
+    start_type = np.uint8 if w <= 256 else np.dtype("<u2")
+    return row_offsets.tobytes(), starts.astype(start_type).tobytes(), data[rows, starts].astype(np.uint8).tobytes()
+
+def encode_chunk(data):
+    """Returns (kind, value, payload bytes) for one chunk array, picking the smallest encoding."""
+    first = data.flat[0]
+    if (data == first).all():
+        return KIND_UNIFORM, int(first), b""
+
+    candidates = []
+    h, w = data.shape
+    if h == w and (w & (w - 1)) == 0:
+        n, bitmap, leaves = encode_quadtree(data)
+        candidates.append((KIND_QUADTREE, struct.pack("<I", n) + bitmap + leaves))
+    row_offsets, starts, values = encode_rle(data)
+    candidates.append((KIND_RLE, struct.pack("<I", len(values)) + row_offsets + starts + values))
+
+    # Raw size is what stays resident once loaded, so pick on that rather than the deflated size
+    kind, payload = min(candidates, key=lambda c: len(c[1]))
+    return kind, 0, payload
+
+def build_pack(data_dir, out_path, chunks=None):
+    """Encodes every baked data_X_Y.png in data_dir into one sparse pack file.
+
+    chunks optionally maps (cx, cy) to chunk images/arrays already in memory
+    (e.g. straight from the baker), which are used instead of re-reading the PNG.
+    """
+    chunks = chunks or {}
+    cells = None
+    index = []
+    blobs = []
+    offset = 0
+    stats = {KIND_MISSING: 0, KIND_UNIFORM: 0, KIND_QUADTREE: 0, KIND_RLE: 0}
+
+    for cy in range(GRID_SIZE):
+        for cx in range(GRID_SIZE):
+            path = os.path.join(data_dir, f"data_{cx}_{cy}.png")
+            if (cx, cy) in chunks:
+                data = np.asarray(chunks[(cx, cy)], dtype=np.uint8)
+            elif os.path.exists(path):
+                with Image.open(path) as img:
+                    data = np.asarray(img.convert("L"), dtype=np.uint8)
+            else:
+                index.append((KIND_MISSING, 0, 0, 0))
+                stats[KIND_MISSING] += 1
+                continue
+
+            if cells is None:
+                cells = data.shape[0]
+            if data.shape != (cells, cells):
+                raise ValueError(f"{path} is {data.shape}, expected {(cells, cells)}")
+
+            kind, value, payload = encode_chunk(data)
+            if payload:
+                payload = zlib.compress(payload, 9)
+            index.append((kind, value, offset, len(payload)))
+            blobs.append(payload)
+            offset += len(payload)
+            stats[kind] += 1
+
+    with open(out_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, GRID_SIZE, cells or 0, rle_offset_type(cells or 1).itemsize))
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        for blob in blobs:
+            f.write(blob)
+
+    return stats
+
+# --- Decoding / Queries ---
+
+class UniformChunk:
+    def __init__(self, value, cells):
+        self.value = value
+        self.cells = cells
+
+    def lookup(self, xs, ys):
+        return np.full(len(xs), self.value, dtype=np.uint8)
+
+    def rect_counts(self, x0, y0, x1, y1):
+        counts = np.zeros(256, dtype=np.int64)
+        counts[self.value] = (x1 - x0) * (y1 - y0)
+        return counts
+
+    def decode(self):
+        return np.full((self.cells, self.cells), self.value, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return 1
+
+class QuadtreeChunk:
+    def __init__(self, payload, cells):
+        n = struct.unpack_from("<I", payload)[0]
+        nbitmap = (n + 7) // 8
+        self.cells = cells
+        self.depth = cells.bit_length() - 1
+        self.bitmap = np.frombuffer(payload, dtype=np.uint8, count=nbitmap, offset=4)
+        self.leaves = np.frombuffer(payload, dtype=np.uint8, offset=4 + nbitmap)
+        # Internal nodes before each bitmap byte, so rank() is one lookup + one popcount
+        rank = np.concatenate(([0], np.cumsum(_POPCOUNT[self.bitmap], dtype=np.int64)))
+        self.byte_rank = rank.astype(np.uint16 if rank[-1] <= 0xFFFF else np.uint32)
+
+    def _is_internal(self, i):
+        return (self.bitmap[i >> 3] >> (i & 7)) & 1 == 1
+
+    def _rank(self, i):
+        # Number of internal nodes strictly before node i
+        below = self.bitmap[i >> 3] & ((1 << (i & 7)) - 1).astype(np.uint8)
+        return self.byte_rank[i >> 3].astype(np.int64) + _POPCOUNT[below]
+
+    def lookup(self, xs, ys):
+        """Vectorized point lookup, one tree level per step (at most log2(cells) + 1 steps)."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        node = np.zeros(len(xs), dtype=np.int64)
+        for level in range(self.depth + 1):
+            internal = self._is_internal(node)
+            if not internal.any():
+                break
+            bit = self.depth - 1 - level
+            quadrant = ((ys[internal] >> bit) & 1) * 2 + ((xs[internal] >> bit) & 1)
+            node[internal] = 1 + 4 * self._rank(node[internal]) + quadrant
+        return self.leaves[node - self._rank(node)]
+
+    def _walk(self, visit):
+        """Level-order walk handing every leaf (x, y, size, value) batch per level to visit()."""
+        node = np.zeros(1, dtype=np.int64)
+        xs = np.zeros(1, dtype=np.int64)
+        ys = np.zeros(1, dtype=np.int64)
+        size = self.cells
+        while len(node):
+            internal = self._is_internal(node)
+            leaf = ~internal
+            if leaf.any():
+                visit(xs[leaf], ys[leaf], size, self.leaves[node[leaf] - self._rank(node[leaf])])
+            size //= 2
+            first = 1 + 4 * self._rank(node[internal])
+            node = (first[:, None] + np.arange(4)).ravel()
+            xs = (xs[internal][:, None] + np.array([0, size, 0, size])).ravel()
+            ys = (ys[internal][:, None] + np.array([0, 0, size, size])).ravel()
+
+    def rect_counts(self, x0, y0, x1, y1):
+        """Histogram of values in [x0, x1) x [y0, y1), only descending into nodes the rect cuts."""
+        counts = np.zeros(256, dtype=np.int64)
+        node = np.zeros(1, dtype=np.int64)
+        xs = np.zeros(1, dtype=np.int64)
+        ys = np.zeros(1, dtype=np.int64)
+        size = self.cells
+        while len(node):
+            # Drop nodes outside the rect
+            keep = (xs < x1) & (xs + size > x0) & (ys < y1) & (ys + size > y0)
+            node, xs, ys = node[keep], xs[keep], ys[keep]
+            if not len(node):
+                break
+
+            internal = self._is_internal(node)
+            leaf = ~internal
+            if leaf.any():
+                lx, ly = xs[leaf], ys[leaf]
+                area = (np.minimum(lx + size, x1) - np.maximum(lx, x0)) * \
+                       (np.minimum(ly + size, y1) - np.maximum(ly, y0))
+                np.add.at(counts, self.leaves[node[leaf] - self._rank(node[leaf])], area)
+
+            size //= 2
+            first = 1 + 4 * self._rank(node[internal])
+            node = (first[:, None] + np.arange(4)).ravel()
+            xs = (xs[internal][:, None] + np.array([0, size, 0, size])).ravel()
+            ys = (ys[internal][:, None] + np.array([0, 0, size, size])).ravel()
+        return counts
+
+    def decode(self):
+        out = np.empty((self.cells, self.cells), dtype=np.uint8)
+
+        def paint(xs, ys, size, values):
+            for x, y, v in zip(xs.tolist(), ys.tolist(), values.tolist()):
+                out[y:y + size, x:x + size] = v
+
+        self._walk(paint)
+        return out
+
+    @property
+    def nbytes(self):
+        return self.bitmap.nbytes + self.leaves.nbytes + self.byte_rank.nbytes
+
+class RleChunk:
+    def __init__(self, payload, cells, offset_width=2):
+        runs = struct.unpack_from("<I", payload)[0]
+        self.cells = cells
+        start_type = np.uint8 if cells <= 256 else np.dtype("<u2")
+        offset_type = np.dtype(f"<u{offset_width}")
+        offset = 4 + offset_width * cells
+        # Row r's runs are [row_offsets[r], row_offsets[r + 1]), the extra entry closes the last row
+        rows = np.frombuffer(payload, dtype=offset_type, count=cells, offset=4)
+        self.row_offsets = np.append(rows, runs).astype(np.uint32)
+        self.starts = np.frombuffer(payload, dtype=start_type, count=runs, offset=offset)
+        self.values = np.frombuffer(payload, dtype=np.uint8, count=runs, offset=offset + runs * self.starts.itemsize)
+        self.steps = max(cells - 1, 1).bit_length() + 1
+
+    def lookup(self, xs, ys):
+        """Vectorized bisection over each row's run starts (log2(cells) steps)."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        lo = self.row_offsets[ys].astype(np.int64)
+        hi = self.row_offsets[ys + 1].astype(np.int64)
+        for _ in range(self.steps):
+            mid = (lo + hi) >> 1
+            right = self.starts[mid] <= xs
+            lo = np.where(right, mid, lo)
+            hi = np.where(right, hi, mid)
+        return self.values[lo]
+
+    def _run_ends(self, first, last):
+        # End x of runs [first, last): next run's start, or the row width for a row's last run
+        ends = np.append(self.starts[first + 1:last], 0).astype(np.int64)
+        row_last = self.row_offsets[1:] - 1
+        row_last = row_last[(row_last >= first) & (row_last < last)]
+        ends[row_last - first] = self.cells
+        return ends
+
+    def rect_counts(self, x0, y0, x1, y1):
+        if x0 >= x1 or y0 >= y1:
+            return np.zeros(256, dtype=np.int64)
+        first, last = int(self.row_offsets[y0]), int(self.row_offsets[y1])
+        starts = self.starts[first:last].astype(np.int64)
+        overlap = np.minimum(self._run_ends(first, last), x1) - np.maximum(starts, x0)
+        return np.bincount(self.values[first:last], weights=np.maximum(overlap, 0), minlength=256).astype(np.int64)
+
+    def decode(self):
+        lengths = self._run_ends(0, len(self.values)) - self.starts
+        return np.repeat(self.values, lengths).reshape(self.cells, self.cells)
+
+    @property
+    def nbytes(self):
+        return self.row_offsets.nbytes + self.starts.nbytes + self.values.nbytes
+
+class SparseTerrain:
+    """Query API over a terrain_sparse.bin pack, same semantics as TerrainMap/MapLoader.get_terrain_at."""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(load_config().get("output_dir", "map_data"), OUTPUT_FILE)
+        with open(path, 'rb') as f:
+            blob = f.read()
+
+        magic, version, grid, cells, offset_width = HEADER.unpack_from(blob)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} sparse terrain pack")
+
+        self.grid = grid
+        self.cells = cells
+        self.chunks = {}
+        payload_start = HEADER.size + grid * grid * INDEX_ENTRY.size
+        for i in range(grid * grid):
+            kind, value, offset, length = INDEX_ENTRY.unpack_from(blob, HEADER.size + i * INDEX_ENTRY.size)
+            coord = (i % grid, i // grid)
+            start = payload_start + offset
+            if kind == KIND_UNIFORM:
+                self.chunks[coord] = UniformChunk(value, cells)
+            elif kind == KIND_QUADTREE:
+                self.chunks[coord] = QuadtreeChunk(zlib.decompress(blob[start:start + length]), cells)
+            elif kind == KIND_RLE:
+                self.chunks[coord] = RleChunk(zlib.decompress(blob[start:start + length]), cells, offset_width)
+
+    @property
+    def resident_bytes(self):
+        return sum(c.nbytes for c in self.chunks.values())
+
+    def get_terrain_at(self, x, y):
+        return int(self.get_terrain_batch([(x, y)])[0])
+
+    def get_terrain_batch(self, positions):
+        """Looks up an (N, 2) array of world positions, returns (N,) uint8 IDs."""
+        pos = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        xs, ys = pos[:, 0], pos[:, 1]
+        out = np.zeros(len(pos), dtype=np.uint8)
+
+        limit = CHUNK_SIZE * self.grid
+        idx = np.flatnonzero((xs >= 0) & (ys >= 0) & (xs < limit) & (ys < limit))
+        if len(idx) == 0:
+            return out
+        xs, ys = xs[idx], ys[idx]
+        cxs = (xs // CHUNK_SIZE).astype(np.int64)
+        cys = (ys // CHUNK_SIZE).astype(np.int64)
+
+        ratio = self.cells / float(CHUNK_SIZE)
+        px = np.clip(((xs - cxs * CHUNK_SIZE) * ratio).astype(np.int64), 0, self.cells - 1)
+        py = np.clip(((ys - cys * CHUNK_SIZE) * ratio).astype(np.int64), 0, self.cells - 1)
+
+        keys = cys * self.grid + cxs
+        for k in np.unique(keys).tolist():
+            chunk = self.chunks.get((k % self.grid, k // self.grid))
+            if chunk is None:
+                continue # Default/Walkable
+            sel = np.flatnonzero(keys == k)
+            out[idx[sel]] = chunk.lookup(px[sel], py[sel])
+        return out
+
+    def rect_counts(self, x0, y0, x1, y1):
+        """Histogram (256,) of terrain cells overlapping the world rect [x0, x1) x [y0, y1)."""
+        scale = self.cells / float(CHUNK_SIZE)
+        limit = self.grid * self.cells
+        gx0 = max(int(np.floor(x0 * scale)), 0)
+        gy0 = max(int(np.floor(y0 * scale)), 0)
+        gx1 = min(int(np.ceil(x1 * scale)), limit)
+        gy1 = min(int(np.ceil(y1 * scale)), limit)
+
+        counts = np.zeros(256, dtype=np.int64)
+        if gx0 >= gx1 or gy0 >= gy1:
+            return counts
+        for cy in range(gy0 // self.cells, (gy1 - 1) // self.cells + 1):
+            for cx in range(gx0 // self.cells, (gx1 - 1) // self.cells + 1):
+                ox, oy = cx * self.cells, cy * self.cells
+                rx0, ry0 = max(gx0 - ox, 0), max(gy0 - oy, 0)
+                rx1, ry1 = min(gx1 - ox, self.cells), min(gy1 - oy, self.cells)
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    counts[0] += (rx1 - rx0) * (ry1 - ry0)
+                else:
+                    counts += chunk.rect_counts(rx0, ry0, rx1, ry1)
+        return counts
+
+    def decode_chunk(self, cx, cy):
+        chunk = self.chunks.get((cx, cy))
+        return chunk.decode() if chunk is not None else None
+
+def main():
+    config = load_config()
+    data_dir = config["output_dir"]
+    out_path = os.path.join(data_dir, OUTPUT_FILE)
+
+    print(f"Encoding {data_dir} into {out_path}...")
+    t0 = time.perf_counter()
+    stats = build_pack(data_dir, out_path)
+    print(f"  {stats[KIND_UNIFORM]} uniform, {stats[KIND_QUADTREE]} quadtree, "
+          f"{stats[KIND_RLE]} RLE, {stats[KIND_MISSING]} missing ({time.perf_counter() - t0:.1f}s)")
+
+    png_bytes = sum(
+        os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir)
+        if f.startswith("data_") and f.endswith(".png")
+    )
+    sparse = SparseTerrain(out_path)
+    dense = len(sparse.chunks) * sparse.cells * sparse.cells
+    print(f"  On disk:  {os.path.getsize(out_path) // 1024} KB (PNG chunks: {png_bytes // 1024} KB)")
+    print(f"  Resident: {sparse.resident_bytes // 1024} KB (L8 images: {dense // 1024} KB)")
+
+if __name__ == "__main__":
+    main()